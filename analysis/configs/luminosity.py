@@ -0,0 +1,6 @@
+# integrated luminosity in pb^-1 (dataset xsec are in pb) {year: luminosity}
+# https://twiki.cern.ch/twiki/bin/view/CMS/PdmVRun3Analysis
+LUMINOSITY = {
+    "2022": 7980.4,
+    "2022EE": 26671.7,
+}
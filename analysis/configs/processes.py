@@ -0,0 +1,22 @@
+# samples stacked into each physics process {process: [samples]}
+PROCESSES = {
+    "DY": ["DYto2L_2Jets_0J", "DYto2L_2Jets_1J", "DYto2L_2Jets_2J"],
+    "ZZ": ["ZZto4L"],
+    "ggZZ": [
+        "GluGluToContinto2Zto2E2Mu",
+        "GluGluToContinto2Zto2E2Tau",
+        "GluGluToContinto2Zto2Mu2Tau",
+        "GluGlutoContinto2Zto4E",
+        "GluGlutoContinto2Zto4Mu",
+        "GluGlutoContinto2Zto4Tau",
+    ],
+    "HZZ": [
+        "GluGluHtoZZto4L",
+        "VBFHto2Zto4L",
+        "WminusH_Hto2Zto4L",
+        "WplusH_Hto2Zto4L",
+        "ZHto2Zto4L",
+        "TTH_Hto2Z",
+        "bbH_Hto2Zto4L",
+    ],
+}
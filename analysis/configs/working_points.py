@@ -0,0 +1,116 @@
+import weakref
+import awkward as ak
+
+
+# working points thresholds {year: {flavor: {tagger: {wp: {discriminant: threshold}}}}}
+WORKING_POINTS = {
+    "2022EE": {
+        # https://indico.cern.ch/event/1304360/contributions/5518916/attachments/2692786/4673101/230731_BTV.pdf
+        "c": {
+            "deepjet": {
+                "loose": {"btagDeepFlavCvB": 0.206, "btagDeepFlavCvL": 0.042},
+                "medium": {"btagDeepFlavCvB": 0.298, "btagDeepFlavCvL": 0.108},
+                "tight": {"btagDeepFlavCvB": 0.241, "btagDeepFlavCvL": 0.305},
+            },
+            "pnet": {
+                "loose": {"btagPNetCvB": 0.182, "btagPNetCvL": 0.054},
+                "medium": {"btagPNetCvB": 0.304, "btagPNetCvL": 0.160},
+                "tight": {"btagPNetCvB": 0.258, "btagPNetCvL": 0.491},
+            },
+            "part": {
+                "loose": {"btagRobustParTAK4CvB": 0.067, "btagRobustParTAK4CvL": 0.0390},
+                "medium": {"btagRobustParTAK4CvB": 0.128, "btagRobustParTAK4CvL": 0.117},
+                "tight": {"btagRobustParTAK4CvB": 0.095, "btagRobustParTAK4CvL": 0.358},
+            },
+        },
+        # https://indico.cern.ch/event/1304360/contributions/5518915/attachments/2692528/4678901/BTagPerf_230808_Summer22WPs.pdf
+        "b": {
+            "deepjet": {
+                "loose": {"btagDeepFlavB": 0.0583},
+                "medium": {"btagDeepFlavB": 0.3086},
+                "tight": {"btagDeepFlavB": 0.7183},
+            },
+            "pnet": {
+                "loose": {"btagPNetB": 0.047},
+                "medium": {"btagPNetB": 0.245},
+                "tight": {"btagPNetB": 0.6734},
+            },
+            "part": {
+                "loose": {"btagRobustParTAK4B": 0.0849},
+                "medium": {"btagRobustParTAK4B": 0.4319},
+                "tight": {"btagRobustParTAK4B": 0.8482},
+            },
+        },
+    },
+    "2022": {},
+    "2023": {},
+}
+
+
+
+def get_working_point(year: str, flavor: str, tagger: str, wp: str) -> dict:
+    """
+    get the working point thresholds {discriminant: threshold} of a tagger
+    """
+    try:
+        return WORKING_POINTS[year][flavor][tagger][wp]
+    except KeyError as err:
+        raise ValueError(
+            f"No working point defined for year={year}, flavor={flavor}, tagger={tagger}, wp={wp}"
+        ) from err
+
+
+class WorkingPointMasks:
+    """
+    Lazy table of jet working points masks keyed by (flavor, tagger, wp)
+
+    Masks are only built for the requested combinations and each
+    discriminant comparison is computed once, even if it is shared by
+    several working points. Masks are computed on the full (unselected) jet
+    collection so the same table can be shared by every processor running
+    over a chunk; apply the processor jet selection on top of them.
+
+    Attributes:
+        jets: jet collection
+        year: year of the working points
+    """
+
+    # tables already built for an events chunk {id(events): WorkingPointMasks}
+    _tables = {}
+
+    def __init__(self, jets: ak.Array, year: str) -> None:
+        self.jets = jets
+        self.year = year
+        self._comparisons = {}
+        self._masks = {}
+
+    @classmethod
+    def from_events(cls, events: ak.Array, year: str):
+        """get the table of an events chunk, it is built the first time it is requested"""
+        key = (id(events), year)
+        if key not in cls._tables:
+            cls._tables[key] = cls(events.Jet, year)
+            weakref.finalize(events, cls._tables.pop, key, None)
+        return cls._tables[key]
+
+    def comparison(self, discriminant: str, threshold: float) -> ak.Array:
+        """jets mask for discriminant > threshold"""
+        key = (discriminant, threshold)
+        if key not in self._comparisons:
+            self._comparisons[key] = self.jets[discriminant] > threshold
+        return self._comparisons[key]
+
+    def __getitem__(self, key: tuple) -> ak.Array:
+        if key not in self._masks:
+            flavor, tagger, wp = key
+            mask = None
+            for discriminant, threshold in get_working_point(
+                self.year, flavor, tagger, wp
+            ).items():
+                comparison = self.comparison(discriminant, threshold)
+                mask = comparison if mask is None else mask & comparison
+            self._masks[key] = mask
+        return self._masks[key]
+
+    def __repr__(self):
+        return f"WorkingPointMasks({self.year}, {list(self._masks)})"
@@ -0,0 +1,119 @@
+import json
+import numpy as np
+import awkward as ak
+
+
+class EfficiencyLookup:
+    """
+    Vectorized evaluator of the tagging efficiency maps written by
+    make_efficiency_maps.py
+
+    Each map is stored as a dense (systematic, flavor, pt, eta) array, so an
+    evaluation is a couple of binary searches and a single gather. Values
+    outside the pt and eta ranges are clamped to the edge bins, flavors
+    without a map raise a ValueError.
+    """
+
+    systematics = ["nominal", "down", "up"]
+
+    def __init__(self, corrections: dict) -> None:
+        self.maps = {}
+        for correction in corrections["corrections"]:
+            systematic_nodes = {
+                node["key"]: node["value"]["content"]
+                for node in correction["data"]["content"]
+            }
+            flavors = [node["key"] for node in systematic_nodes["nominal"]]
+            pt_edges, eta_edges = systematic_nodes["nominal"][0]["value"]["edges"]
+            pt_edges, eta_edges = np.array(pt_edges), np.array(eta_edges)
+            shape = (len(pt_edges) - 1, len(eta_edges) - 1)
+
+            values = np.full((len(self.systematics), len(flavors)) + shape, np.nan)
+            for i, systematic in enumerate(self.systematics):
+                for j, node in enumerate(systematic_nodes[systematic]):
+                    values[i, j] = np.reshape(node["value"]["content"], shape)
+
+            # -1 for the flavors without a map
+            flavor_lut = np.full(max(flavors) + 1, -1)
+            flavor_lut[flavors] = np.arange(len(flavors))
+
+            self.maps[correction["name"]] = {
+                "pt": pt_edges,
+                "eta": eta_edges,
+                "flavor_lut": flavor_lut,
+                "values": values,
+            }
+
+    @classmethod
+    def from_json(cls, path: str):
+        with open(path, "r") as handle:
+            return cls(json.load(handle))
+
+    @property
+    def names(self) -> list:
+        return list(self.maps)
+
+    @staticmethod
+    def _bin_index(edges: np.ndarray, values: np.ndarray) -> np.ndarray:
+        index = np.searchsorted(edges, values, side="right") - 1
+        return np.clip(index, 0, len(edges) - 2)
+
+    def evaluate(
+        self,
+        name: str,
+        flavor: np.ndarray,
+        pt: np.ndarray,
+        eta: np.ndarray,
+        systematic: str = "nominal",
+    ) -> np.ndarray:
+        """evaluate the efficiency map 'name' for flat arrays of jets"""
+        efficiency_map = self.maps[name]
+        flavor = np.asarray(flavor, dtype=np.int64)
+        flavor_lut = efficiency_map["flavor_lut"]
+        known = (flavor >= 0) & (flavor < len(flavor_lut))
+        flavor_index = np.full(flavor.shape, -1)
+        flavor_index[known] = flavor_lut[flavor[known]]
+        if np.any(flavor_index < 0):
+            raise ValueError(
+                f"Efficiency map {name} has no flavors {np.unique(flavor[flavor_index < 0]).tolist()}, "
+                f"available: {np.flatnonzero(flavor_lut >= 0).tolist()}"
+            )
+        pt_index = self._bin_index(efficiency_map["pt"], np.asarray(pt))
+        eta_index = self._bin_index(efficiency_map["eta"], np.asarray(eta))
+        values = efficiency_map["values"][self.systematics.index(systematic)]
+        return values[flavor_index, pt_index, eta_index]
+
+    def evaluate_jets(
+        self, name: str, jets: ak.Array, systematic: str = "nominal"
+    ) -> ak.Array:
+        """evaluate the efficiency map 'name' for a jagged jet collection"""
+        counts = ak.num(jets)
+        flat_jets = ak.flatten(jets)
+        efficiency = self.evaluate(
+            name,
+            flavor=ak.to_numpy(flat_jets.hadronFlavour),
+            pt=ak.to_numpy(flat_jets.pt),
+            eta=ak.to_numpy(flat_jets.eta),
+            systematic=systematic,
+        )
+        return ak.unflatten(efficiency, counts)
+
+
+def tagging_event_weight(
+    efficiency: ak.Array, tagged: ak.Array, scale_factor=1.0
+) -> np.ndarray:
+    """
+    per-event tagging weight (fixed working point method 1a)
+
+        w = prod_{tagged} SF_i * prod_{not tagged} (1 - SF_j * eff_j) / (1 - eff_j)
+
+    Parameters:
+        efficiency: jagged array with the MC tagging efficiency of each jet
+        tagged: jagged boolean array, jets passing the working point
+        scale_factor: data/MC scale factor of each jet (scalar or jagged array)
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        untagged_weight = (1 - scale_factor * efficiency) / (1 - efficiency)
+    untagged_weight = ak.where(efficiency < 1, untagged_weight, 1.0)
+    jet_weight = ak.where(tagged, scale_factor * ak.ones_like(efficiency), untagged_weight)
+    return ak.to_numpy(ak.fill_none(ak.prod(jet_weight, axis=1), 1.0))
@@ -0,0 +1,211 @@
+import os
+import sys
+import uuid
+import types
+import pickle
+import inspect
+import hashlib
+import lz4.frame
+from pathlib import Path
+from coffea import processor
+from analysis.configs.load_config import load_config
+
+
+def _analysis_modules(obj, modules=None) -> dict:
+    """analysis modules used by an object, found recursively through module globals"""
+    modules = {} if modules is None else modules
+    module = obj if isinstance(obj, types.ModuleType) else sys.modules.get(obj.__module__)
+    if module is None or not module.__name__.startswith("analysis") or module.__name__ in modules:
+        return modules
+    modules[module.__name__] = module
+    for value in vars(module).values():
+        if isinstance(value, types.ModuleType) or (
+            getattr(value, "__module__", None) or ""
+        ).startswith("analysis"):
+            _analysis_modules(value, modules)
+    return modules
+
+
+def processor_fingerprint(processor_instance, processor_args: dict) -> str:
+    """
+    hash of the source code of the analysis modules used by a processor and
+    of its arguments (see code_fingerprint and arguments_fingerprint)
+    """
+    processors = getattr(processor_instance, "processors", {"": processor_instance})
+    sha = hashlib.sha256()
+    sha.update(code_fingerprint(*[type(instance) for instance in processors.values()]).encode())
+    for name in sorted(processor_args):
+        sha.update(f"{name}={arguments_fingerprint(processor_args[name])}".encode())
+    return sha.hexdigest()
+
+
+def code_fingerprint(*processor_classes) -> str:
+    """hash of the source code of the analysis modules used by processor classes"""
+    sha = hashlib.sha256()
+    modules = {}
+    for processor_class in processor_classes:
+        _analysis_modules(processor_class, modules)
+    for name in sorted(modules):
+        sha.update(name.encode())
+        sha.update(inspect.getsource(modules[name]).encode())
+    return sha.hexdigest()
+
+
+def arguments_fingerprint(processor_args: dict) -> str:
+    """hash of the arguments of a processor. Arguments pointing to files are hashed by content"""
+    sha = hashlib.sha256()
+    for arg, value in sorted(processor_args.items()):
+        sha.update(f"{arg}={value}".encode())
+        if isinstance(value, str) and os.path.isfile(value):
+            sha.update(Path(value).read_bytes())
+    return sha.hexdigest()
+
+
+# dataset configuration fields that change the output of a chunk. The file
+# list, partitions and stepsize are left out: the chunk key already
+# identifies the file and entry range, so adding files to a sample keeps
+# the cached chunks of its other files
+DATASET_FINGERPRINT_FIELDS = ["name", "key", "year", "is_mc", "xsec"]
+
+
+def dataset_fingerprint(dataset: str, year: str) -> str:
+    """hash of the dataset configuration of a fileset key (sample or sample partition)"""
+    for name in [dataset, dataset.rsplit("_", 1)[0]]:
+        try:
+            config = load_config(config_type="dataset", config_name=name, year=year)
+        except Exception:
+            continue
+        fields = [(field, getattr(config, field)) for field in DATASET_FINGERPRINT_FIELDS]
+        return hashlib.sha256(repr(fields).encode()).hexdigest()
+    return ""
+
+
+def chunk_key(fingerprint: str, dataset_fingerprint: str, metadata: dict) -> str:
+    """cache key of a chunk from its events metadata (or a WorkItem-like dict)"""
+    identity = metadata["fileuuid"] or metadata["filename"]
+    return hashlib.sha256(
+        "|".join(
+            [
+                fingerprint,
+                dataset_fingerprint,
+                metadata["dataset"],
+                identity,
+                metadata["treename"],
+                str(metadata["entrystart"]),
+                str(metadata["entrystop"]),
+            ]
+        ).encode()
+    ).hexdigest()
+
+
+def workitem_metadata(chunk) -> dict:
+    """events metadata that coffea builds for a chunk"""
+    return {
+        "dataset": chunk.dataset,
+        "filename": chunk.filename,
+        "treename": chunk.treename,
+        "entrystart": chunk.entrystart,
+        "entrystop": chunk.entrystop,
+        "fileuuid": str(uuid.UUID(bytes=chunk.fileuuid)) if len(chunk.fileuuid) > 0 else "",
+    }
+
+
+class ResultCache:
+    """
+    Local content-addressed store of per-chunk processor outputs
+
+    Entries are lz4 compressed pickles named by their key. Reading an entry
+    updates its modification time, evict() removes the least recently used
+    entries until the cache fits in max_size bytes.
+
+    Attributes:
+        path: cache directory
+        max_size: maximum cache size in bytes
+    """
+
+    def __init__(self, path: str, max_size: int) -> None:
+        self.path = Path(path)
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _entry(self, key: str) -> Path:
+        return Path(self.path / key[:2] / f"{key}.pkl.lz4")
+
+    def __contains__(self, key: str) -> bool:
+        return self._entry(key).exists()
+
+    def get(self, key: str):
+        entry = self._entry(key)
+        with lz4.frame.open(entry, "rb") as handle:
+            value = pickle.load(handle)
+        os.utime(entry)
+        return value
+
+    def put(self, key: str, value) -> None:
+        entry = self._entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp_entry = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        with lz4.frame.open(tmp_entry, "wb") as handle:
+            pickle.dump(value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_entry, entry)
+
+    def evict(self) -> int:
+        """remove least recently used entries above max_size. Returns the number of removed entries"""
+        entries = [
+            (entry.stat().st_mtime, entry.stat().st_size, entry)
+            for entry in self.path.glob("*/*.pkl.lz4")
+        ]
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            entry.unlink(missing_ok=True)
+            total_size -= size
+            removed += 1
+        return removed
+
+    def __repr__(self):
+        return f"ResultCache({self.path}, {self.max_size / 1e9:.1f} GB)"
+
+
+class CachingProcessor(processor.ProcessorABC):
+    """
+    Wrap a processor so that the output of every chunk is stored in a
+    ResultCache. Outputs are written by the workers, so the cache directory
+    has to be local to (or shared with) the workers
+
+    Attributes:
+        processor_instance: wrapped processor
+        cache_path: ResultCache directory
+        max_size: ResultCache maximum size in bytes
+        fingerprint: processor fingerprint, see processor_fingerprint
+        dataset_fingerprints: {dataset: dataset fingerprint}
+    """
+
+    def __init__(
+        self,
+        processor_instance,
+        cache_path: str,
+        max_size: int,
+        fingerprint: str,
+        dataset_fingerprints: dict,
+    ):
+        self.processor_instance = processor_instance
+        self.cache_path = cache_path
+        self.max_size = max_size
+        self.fingerprint = fingerprint
+        self.dataset_fingerprints = dataset_fingerprints
+
+    def process(self, events):
+        output = self.processor_instance.process(events)
+        key = chunk_key(
+            self.fingerprint,
+            self.dataset_fingerprints[events.metadata["dataset"]],
+            events.metadata,
+        )
+        ResultCache(self.cache_path, self.max_size).put(key, output)
+        return output
+
+    def postprocess(self, accumulator):
+        return self.processor_instance.postprocess(accumulator)
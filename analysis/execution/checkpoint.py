@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import concurrent.futures
+from pathlib import Path
+from typing import Callable, Optional
+from dataclasses import dataclass
+from coffea import processor
+from coffea.processor import accumulate
+
+
+def chunk_id(chunk) -> tuple:
+    """identity of a chunk: (file uuid, filename, entry range)"""
+    return (chunk.fileuuid, chunk.filename, chunk.entrystart, chunk.entrystop)
+
+
+def run_signature(config: dict) -> str:
+    """hash of the arguments that define the output of a run"""
+    return hashlib.sha256(
+        json.dumps(config, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class Checkpoint:
+    """
+    Periodically persisted state of a submit.py run: the merged accumulator
+    and the set of completed chunks. A run restarted with the same arguments
+    (same signature) skips the completed chunks and merges into the state.
+
+    Attributes:
+        path: checkpoint file path
+        signature: hash of the run arguments, see run_signature
+    """
+
+    def __init__(self, path: str, signature: str) -> None:
+        self.path = Path(path)
+        self.signature = signature
+
+    def load(self) -> tuple:
+        """accumulator and set of completed chunks ids, (None, set()) if there is no valid checkpoint"""
+        if not self.path.exists():
+            return None, set()
+        try:
+            with open(self.path, "rb") as handle:
+                state = pickle.load(handle)
+        except (EOFError, pickle.UnpicklingError):
+            return None, set()
+        if state.get("signature") != self.signature:
+            return None, set()
+        return state["accumulator"], state["done"]
+
+    def save(self, accumulator, done: set) -> None:
+        """persist the state atomically, a crash while writing keeps the previous checkpoint"""
+        state = {
+            "signature": self.signature,
+            "accumulator": accumulator,
+            "done": done,
+        }
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as handle:
+            pickle.dump(state, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
+
+    def __repr__(self):
+        return f"Checkpoint({self.path})"
+
+
+@dataclass
+class CheckpointFuturesExecutor(processor.FuturesExecutor):
+    """
+    FuturesExecutor that submits all the chunks of a run, in their given
+    order, to a single process pool and merges their outputs as they
+    complete. Every `interval` seconds `checkpoint(output, items)` is called
+    with the merged output and the completed items, so checkpoints do not
+    split the run into batches (each one respawning the pool and waiting
+    for its slowest chunk). If a chunk fails, the chunks still queued are
+    cancelled
+
+    Attributes:
+        pool: live concurrent.futures.Executor, kept for the whole run
+        checkpoint: callback saving the merged output and completed items, None to disable
+        interval: seconds between checkpoints
+    """
+
+    checkpoint: Optional[Callable] = None
+    interval: float = 900
+    compression: Optional[int] = None
+
+    def __call__(self, items, function, accumulator):
+        merged = accumulator
+        completed = []
+        last_checkpoint = time.monotonic()
+        futures = {self.pool.submit(function, item): item for item in items}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                merged = accumulate([future.result()], merged)
+                completed.append(futures.pop(future))
+                if (
+                    self.checkpoint is not None
+                    and futures
+                    and time.monotonic() - last_checkpoint >= self.interval
+                ):
+                    self.checkpoint(merged, completed)
+                    last_checkpoint = time.monotonic()
+        except BaseException:
+            # a failed chunk stops the run, the queued chunks are not processed
+            for future in futures:
+                future.cancel()
+            raise
+        return merged, 0
@@ -0,0 +1,173 @@
+import json
+import glob
+import heapq
+import itertools
+import dataclasses
+import numpy as np
+from collections import defaultdict
+
+
+def expand_filesets(patterns: list) -> list:
+    """expand fileset paths and glob patterns into a sorted list of fileset paths"""
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern)
+        if not matches:
+            raise FileNotFoundError(f"No fileset found for '{pattern}'")
+        paths.update(matches)
+    return sorted(paths)
+
+
+def interleave_chunks(chunks: list) -> list:
+    """
+    order chunks round-robin over datasets, so the chunks of several filesets
+    share the workers instead of being processed one dataset after the other
+    """
+    dataset_chunks = defaultdict(list)
+    for chunk in chunks:
+        dataset_chunks[chunk.dataset].append(chunk)
+    interleaved = itertools.zip_longest(*dataset_chunks.values())
+    return [chunk for chunk in itertools.chain.from_iterable(interleaved) if chunk is not None]
+
+
+def trim_fileset(fileset: dict, nfiles: int) -> dict:
+    """keep the first nfiles files of each dataset. Use nfiles=-1 to keep all"""
+    if nfiles < 0:
+        return fileset
+    return {dataset: files[:nfiles] for dataset, files in fileset.items()}
+
+
+def fileset_ranges(fileset: dict) -> tuple:
+    """
+    split fileset items into files and entry ranges. Items are file paths or
+    {"file": path, "entry_start": start, "entry_stop": stop} entry ranges
+
+    Returns:
+        files: {dataset: [files]} fileset to preprocess
+        ranges: {(dataset, file): [(start, stop)]} for the files that are only
+            partially processed
+    """
+    files, ranges, whole = defaultdict(list), defaultdict(list), set()
+    for dataset, items in fileset.items():
+        for item in items:
+            path = item["file"] if isinstance(item, dict) else item
+            if path not in files[dataset]:
+                files[dataset].append(path)
+            if isinstance(item, dict):
+                ranges[(dataset, path)].append((item["entry_start"], item["entry_stop"]))
+            else:
+                whole.add((dataset, path))
+    ranges = {key: value for key, value in ranges.items() if key not in whole}
+    return dict(files), ranges
+
+
+def restrict_chunks(chunks: list, ranges: dict) -> list:
+    """intersect the chunks of partially processed files with their entry ranges"""
+    if not ranges:
+        return chunks
+    restricted = []
+    for chunk in chunks:
+        file_ranges = ranges.get((chunk.dataset, chunk.filename))
+        if file_ranges is None:
+            restricted.append(chunk)
+            continue
+        for start, stop in file_ranges:
+            start, stop = max(chunk.entrystart, start), min(chunk.entrystop, stop)
+            if start < stop:
+                restricted.append(dataclasses.replace(chunk, entrystart=start, entrystop=stop))
+    return restricted
+
+
+def sample_chunks(chunks: list, maxchunks: int = None, maxevents: int = None) -> list:
+    """
+    select at most maxchunks chunks (or as many chunks as needed to reach
+    maxevents events) per dataset. Chunks are taken evenly spaced over the
+    dataset chunk list, so the selection samples all the files of the dataset
+    instead of the first ones
+    """
+    if not maxchunks and not maxevents:
+        return chunks
+
+    dataset_chunks = defaultdict(list)
+    for chunk in chunks:
+        dataset_chunks[chunk.dataset].append(chunk)
+
+    sampled = []
+    for dataset, items in dataset_chunks.items():
+        nchunks = len(items)
+        if maxevents:
+            mean_events = np.mean([len(chunk) for chunk in items])
+            nchunks = min(nchunks, int(np.ceil(maxevents / mean_events)))
+        if maxchunks:
+            nchunks = min(nchunks, maxchunks)
+        selected = np.unique(np.linspace(0, len(items) - 1, nchunks).round().astype(int))
+        sampled.extend(items[i] for i in selected)
+    return sampled
+
+
+def historical_time_per_event(metadata_files: dict) -> dict:
+    """
+    time per event of each dataset from the metadata of previous runs
+
+    Parameters:
+        metadata_files: {dataset: [metadata json paths]}, the cpu time of all
+            the files of a dataset (e.g. one per processor) is added up
+
+    Returns:
+        {dataset: seconds per event} for the datasets with usable metadata
+    """
+    time_per_event = {}
+    for dataset, paths in metadata_files.items():
+        cputime, nevents = 0.0, 0
+        for path in paths:
+            try:
+                with open(path, "r") as f:
+                    metadata = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            if "cputime" in metadata and metadata.get("nevents"):
+                cputime += metadata["cputime"]
+                nevents = metadata["nevents"]
+        if nevents:
+            time_per_event[dataset] = cputime / nevents
+    return time_per_event
+
+
+def chunk_costs(chunks: list, time_per_event: dict = None) -> list:
+    """
+    expected processing time of each chunk: number of entries times the
+    dataset time per event. Datasets without history use the mean time per
+    event of the other datasets (or 1, i.e. the cost is the number of entries)
+    """
+    time_per_event = time_per_event or {}
+    default = np.mean(list(time_per_event.values())) if time_per_event else 1.0
+    return [len(chunk) * time_per_event.get(chunk.dataset, default) for chunk in chunks]
+
+
+def lpt_order(chunks: list, costs: list) -> list:
+    """order chunks longest-processing-time first"""
+    order = np.argsort(costs, kind="stable")[::-1]
+    return [chunks[i] for i in order]
+
+
+def simulate_makespan(costs: list, workers: int) -> float:
+    """makespan of greedy list scheduling of the costs (in order) on the workers"""
+    finish_times = [0.0] * max(workers, 1)
+    for cost in costs:
+        earliest = heapq.heappop(finish_times)
+        heapq.heappush(finish_times, earliest + cost)
+    return max(finish_times)
+
+
+def makespan_report(chunks: list, costs: list, workers: int, ordered: list) -> dict:
+    """
+    compare the predicted makespan of the submitted order with the naive
+    order of chunks (the fileset order coffea dispatches, before interleaving
+    or reordering) and the lower bound max(total / workers, longest chunk)
+    """
+    cost_by_chunk = dict(zip(chunks, costs))
+    return {
+        "naive": simulate_makespan(costs, workers),
+        "ordered": simulate_makespan([cost_by_chunk[chunk] for chunk in ordered], workers),
+        "lower_bound": max(sum(costs) / max(workers, 1), max(costs, default=0)),
+    }
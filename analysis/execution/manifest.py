@@ -0,0 +1,51 @@
+import json
+from analysis.processors.signal import SignalProcessor
+from analysis.processors.tag_eff import TaggingEfficiencyProcessor
+from analysis.execution.checkpoint import run_signature
+from analysis.execution.cache import code_fingerprint, arguments_fingerprint
+
+PROCESSORS = {
+    "tag_eff": TaggingEfficiencyProcessor,
+    "signal": SignalProcessor,
+}
+
+
+def processor_arguments(args: dict) -> dict:
+    """{processor: arguments} of the processors from the submit.py options"""
+    return {
+        "tag_eff": {
+            "year": args["year"],
+            "tagger": args["tagger"],
+            "flavor": args["flavor"],
+            "wp": args["wp"],
+            "mode": args["mode"],
+        },
+        "signal": {
+            "year": args["year"],
+            "efficiency_maps": args["efficiency_maps"] or None,
+            "scale_factors": args["scale_factors"] or None,
+        },
+    }
+
+
+def output_manifest(name: str, args: dict, items: list) -> dict:
+    """
+    manifest of the output of a processor on a fileset: hashes of its input
+    files (or entry ranges), of the source code of the processor and of its
+    arguments. An output is only valid for the inputs, code and arguments of
+    its manifest. The files hash does not depend on the order of the items,
+    so an output extended with new files matches a run over all of them
+    """
+    return {
+        "files": run_signature(
+            sorted(items, key=lambda item: json.dumps(item, sort_keys=True, default=str))
+        ),
+        "code": code_fingerprint(PROCESSORS[name]),
+        "arguments": arguments_fingerprint(processor_arguments(args)[name]),
+    }
+
+
+def manifest_mismatch(metadata: dict, manifest: dict) -> list:
+    """fields of the manifest that differ from the one recorded in the output metadata"""
+    recorded = metadata.get("manifest", {})
+    return [field for field, value in manifest.items() if recorded.get(field) != value]
@@ -0,0 +1,117 @@
+import os
+import json
+import pickle
+import socket
+from pathlib import Path
+from analysis.execution.store import write_histograms
+
+OUTPUT_FORMATS = {"npz": ".npz", "npz_uncompressed": ".npz", "pickle": ".pkl"}
+
+
+def processor_path(args: dict, processor: str) -> str:
+    """relative path of a processor outputs and condor files"""
+    path = f"{processor}/{args['year']}"
+    if processor == "tag_eff":
+        wp = "discriminant" if args["mode"] == "discriminant" else args["wp"]
+        path = f"{path}/{args['tagger']}/{args['flavor']}/{wp}"
+    return path
+
+
+def save_output(
+    histograms: dict,
+    metadata: dict,
+    output_path: str,
+    key: str,
+    output_format: str = "npz",
+) -> None:
+    """
+    save the histograms (in one of OUTPUT_FORMATS) and metadata of a fileset.
+    Each file is written to a temporary file and renamed, the metadata last:
+    an output is complete once its metadata exists, and several jobs writing
+    the same output (e.g. duplicates of a straggler) never leave it partial
+    """
+    output_file = Path(f"{output_path}/{key}{OUTPUT_FORMATS[output_format]}")
+    if output_format == "pickle":
+        tmp_file = tmp_path(output_file)
+        with open(tmp_file, "wb") as handle:
+            pickle.dump(histograms, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, output_file)
+    else:
+        write_histograms(histograms, output_file, compress=output_format == "npz")
+    for stale_file in histograms_files(output_path, key):
+        if stale_file != output_file:
+            stale_file.unlink(missing_ok=True)
+    metadata_file = Path(f"{output_path}/{key}_metadata.json")
+    tmp_file = tmp_path(metadata_file)
+    with open(tmp_file, "w") as f:
+        f.write(json.dumps(metadata))
+    os.replace(tmp_file, metadata_file)
+
+
+def tmp_path(path: Path) -> Path:
+    """temporary file next to path, unique across the hosts sharing the output directory"""
+    return path.with_name(f"{path.name}.{socket.gethostname()}.{os.getpid()}.tmp")
+
+
+def histograms_files(output_path: str, key: str) -> list:
+    """histograms files of a fileset output (in any format)"""
+    suffixes = set(OUTPUT_FORMATS.values())
+    return [path for path in Path(output_path).glob(f"{key}.*") if path.suffix in suffixes]
+
+
+def load_metadata(output_path: str, key: str) -> dict:
+    """metadata of a fileset output, None if it does not exist"""
+    path = Path(f"{output_path}/{key}_metadata.json")
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def incremental_fileset(fileset: dict, output_paths: dict) -> tuple:
+    """
+    diff a fileset against the inputs recorded in the metadata of previous
+    outputs. A key whose previous output has files that are not in its
+    fileset anymore (files removed, or moved to another partition when the
+    sample was repartitioned) is processed in full. With count partitioning,
+    adding files to a sample shifts files across all of its partitions, so
+    only stable partitioning keeps the other partitions incremental
+
+    Parameters:
+        fileset: {key: [files]}
+        output_paths: {processor: output path}
+
+    Returns:
+        new_fileset: {key: [files]} with only the files not processed before
+            (datasets without new files are dropped)
+        previous: {key: {processor: metadata}} metadata of the outputs the new
+            results have to be merged into
+    """
+    new_fileset, previous = {}, {}
+    for key, files in fileset.items():
+        metadata = {
+            name: load_metadata(path, key) for name, path in output_paths.items()
+        }
+        if any(m is None or "quicklook" in m for m in metadata.values()):
+            # no complete previous output, process everything
+            new_fileset[key] = files
+            continue
+        processed = [json.dumps(m["fileset"], sort_keys=True) for m in metadata.values()]
+        if len(set(processed)) > 1:
+            raise ValueError(
+                f"Previous outputs of {key} were produced from different inputs, "
+                "run the processors separately or without --incremental"
+            )
+        processed_files = {
+            json.dumps(f, sort_keys=True) for f in next(iter(metadata.values()))["fileset"]
+        }
+        current_files = {json.dumps(f, sort_keys=True) for f in files}
+        if not processed_files <= current_files:
+            print(f"{key}: files were removed or repartitioned, processing all of them")
+            new_fileset[key] = files
+            continue
+        added = [f for f in files if json.dumps(f, sort_keys=True) not in processed_files]
+        if added:
+            new_fileset[key] = added
+            previous[key] = metadata
+    return new_fileset, previous
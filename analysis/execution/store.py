@@ -0,0 +1,178 @@
+import os
+import json
+import socket
+import struct
+import zipfile
+import numpy as np
+import hist
+from pathlib import Path
+from collections.abc import Mapping
+
+INDEX_MEMBER = "__index__.npy"
+
+
+def _axis_metadata(axis) -> dict:
+    """json description of a hist axis"""
+    traits = axis.traits
+    # axis.label falls back to the name when no label is set
+    metadata = {"name": axis.name, "label": axis.__dict__.get("label", "")}
+    if isinstance(axis, hist.axis.Regular) and axis.transform is None:
+        metadata.update(
+            {
+                "type": "Regular",
+                "bins": axis.size,
+                "start": float(axis.edges[0]),
+                "stop": float(axis.edges[-1]),
+            }
+        )
+    elif isinstance(axis, hist.axis.Integer):
+        metadata.update(
+            {"type": "Integer", "start": int(axis.edges[0]), "stop": int(axis.edges[-1])}
+        )
+    elif isinstance(axis, (hist.axis.Regular, hist.axis.Variable)):
+        # transformed Regular axes are stored by their edges
+        metadata.update({"type": "Variable", "edges": axis.edges.tolist()})
+    elif isinstance(axis, hist.axis.IntCategory):
+        metadata.update({"type": "IntCategory", "categories": [int(c) for c in axis]})
+    elif isinstance(axis, hist.axis.StrCategory):
+        metadata.update({"type": "StrCategory", "categories": list(axis)})
+    elif isinstance(axis, hist.axis.Boolean):
+        return {"type": "Boolean", **metadata}
+    else:
+        raise TypeError(f"Unsupported axis type {type(axis).__name__}")
+    metadata.update(
+        {
+            "underflow": traits.underflow,
+            "overflow": traits.overflow,
+            "growth": traits.growth,
+            "circular": traits.circular,
+        }
+    )
+    return metadata
+
+
+def _build_axis(metadata: dict):
+    """hist axis from its json description"""
+    kwargs = {"name": metadata["name"], "label": metadata["label"]}
+    if metadata["type"] == "Boolean":
+        return hist.axis.Boolean(**kwargs)
+    kwargs["growth"] = metadata["growth"]
+    if metadata["type"] in ["IntCategory", "StrCategory"]:
+        axis_type = getattr(hist.axis, metadata["type"])
+        return axis_type(metadata["categories"], overflow=metadata["overflow"], **kwargs)
+    kwargs.update(
+        {
+            "underflow": metadata["underflow"],
+            "overflow": metadata["overflow"],
+            "circular": metadata["circular"],
+        }
+    )
+    if metadata["type"] == "Regular":
+        return hist.axis.Regular(
+            metadata["bins"], metadata["start"], metadata["stop"], **kwargs
+        )
+    if metadata["type"] == "Integer":
+        return hist.axis.Integer(metadata["start"], metadata["stop"], **kwargs)
+    return hist.axis.Variable(metadata["edges"], **kwargs)
+
+
+def write_histograms(histograms: dict, path: str, compress: bool = True) -> None:
+    """
+    write a {name: hist.Hist} dict as an npz archive: one .npy member per
+    histogram with its bin contents (flow bins included, structured dtype for
+    Weight/Mean storages) and a json index with the axes and storage of each
+    histogram. The archive is written atomically
+
+    Parameters:
+        histograms: {name: hist.Hist}
+        path: output .npz path
+        compress: deflate the members. Uncompressed members can be memory mapped
+    """
+    path = Path(path)
+    index = {"version": 1, "histograms": {}}
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    tmp_path = path.with_name(f"{path.name}.{socket.gethostname()}.{os.getpid()}.tmp")
+    with zipfile.ZipFile(tmp_path, "w", compression=compression, allowZip64=True) as archive:
+        for i, (name, histogram) in enumerate(histograms.items()):
+            member = f"{i}.npy"
+            index["histograms"][name] = {
+                "member": member,
+                "storage": histogram.storage_type.__name__,
+                "axes": [_axis_metadata(axis) for axis in histogram.axes],
+            }
+            values = np.ascontiguousarray(np.asarray(histogram.view(flow=True)))
+            with archive.open(member, "w", force_zip64=True) as handle:
+                np.lib.format.write_array(handle, values, allow_pickle=False)
+        with archive.open(INDEX_MEMBER, "w") as handle:
+            index_array = np.frombuffer(json.dumps(index).encode(), dtype=np.uint8)
+            np.lib.format.write_array(handle, index_array, allow_pickle=False)
+    os.replace(tmp_path, path)
+
+
+class HistogramStore(Mapping):
+    """
+    Read-only {name: hist.Hist} mapping over an archive written by
+    write_histograms. Only the index is read when the store is opened,
+    histograms are read (and built) when they are accessed
+
+    Attributes:
+        path: .npz archive path
+        index: {name: {"member", "storage", "axes"}}
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        with zipfile.ZipFile(self.path) as archive:
+            with archive.open(INDEX_MEMBER) as handle:
+                index = json.loads(np.lib.format.read_array(handle).tobytes())
+        self.index = index["histograms"]
+
+    def view(self, name: str) -> np.ndarray:
+        """
+        bin contents of a histogram (flow bins included). Uncompressed members
+        are memory mapped instead of read
+        """
+        member = self.index[name]["member"]
+        with zipfile.ZipFile(self.path) as archive:
+            info = archive.getinfo(member)
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as handle:
+                    return np.lib.format.read_array(handle, allow_pickle=False)
+        with open(self.path, "rb") as handle:
+            # the member data follows its local file header
+            handle.seek(info.header_offset)
+            header = handle.read(30)
+            name_length, extra_length = struct.unpack("<HH", header[26:30])
+            handle.seek(info.header_offset + 30 + name_length + extra_length)
+            if np.lib.format.read_magic(handle) == (1, 0):
+                header = np.lib.format.read_array_header_1_0(handle)
+            else:
+                header = np.lib.format.read_array_header_2_0(handle)
+            shape, fortran_order, dtype = header
+            offset = handle.tell()
+        return np.memmap(
+            self.path,
+            dtype=dtype,
+            mode="r",
+            offset=offset,
+            shape=shape,
+            order="F" if fortran_order else "C",
+        )
+
+    def __getitem__(self, name: str) -> hist.Hist:
+        metadata = self.index[name]
+        histogram = hist.Hist(
+            *[_build_axis(axis) for axis in metadata["axes"]],
+            storage=getattr(hist.storage, metadata["storage"])(),
+        )
+        histogram.view(flow=True)[...] = self.view(name)
+        return histogram
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __repr__(self):
+        return f"HistogramStore({self.path}, {len(self)} histograms)"
@@ -0,0 +1,51 @@
+import os
+import json
+import uproot
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+
+def file_info(path: str, treename: str = "Events") -> dict:
+    """number of entries of the tree and size in bytes of a ROOT file"""
+    with uproot.open(path) as root_file:
+        return {"entries": root_file[treename].num_entries, "bytes": root_file.file.fEND}
+
+
+class FileIndex:
+    """
+    Cache of the number of entries and size of ROOT files, stored as a JSON
+    {file: {"entries": entries, "bytes": bytes}}. Files are only opened the
+    first time they are requested
+
+    Attributes:
+        path: index JSON path
+        treename: name of the tree whose entries are counted
+    """
+
+    def __init__(self, path: str, treename: str = "Events") -> None:
+        self.path = Path(path)
+        self.treename = treename
+        self.index = {}
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                self.index = json.load(f)
+
+    def get(self, files: list, workers: int = 8) -> dict:
+        """{file: {"entries", "bytes"}} of the files, opening the files missing in the index"""
+        missing = [path for path in dict.fromkeys(files) if path not in self.index]
+        if missing:
+            print(f"indexing {len(missing)} files")
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                infos = pool.map(lambda path: file_info(path, self.treename), missing)
+                self.index.update(zip(missing, infos))
+            self.save()
+        return {path: self.index[path] for path in files}
+
+    def save(self) -> None:
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def __repr__(self):
+        return f"FileIndex({self.path}, {len(self.index)} files)"
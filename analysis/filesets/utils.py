@@ -1,8 +1,13 @@
 import json
 import glob
+import heapq
+import bisect
+import hashlib
+import numpy as np
 from pathlib import Path
 from collections import OrderedDict
 from analysis.configs.load_config import load_config
+from analysis.filesets.index import FileIndex
 
 
 def divide_list(lst: list, n: int) -> list:
@@ -21,44 +26,182 @@ def divide_list(lst: list, n: int) -> list:
     return result
 
 
+def balanced_partitions(items: list, costs: list, n: int) -> list:
+    """
+    bin-pack items into n partitions of balanced total cost: items are assigned
+    in decreasing cost order to the partition with the lowest total cost (LPT).
+    Items keep their original order inside each partition
+    """
+    n = max(min(n, len(items)), 1)
+    loads = [(0.0, i) for i in range(n)]
+    assignment = [[] for _ in range(n)]
+    for index in np.argsort(costs, kind="stable")[::-1]:
+        load, partition = heapq.heappop(loads)
+        assignment[partition].append(index)
+        heapq.heappush(loads, (load + costs[index], partition))
+    return [[items[i] for i in sorted(indices)] for indices in assignment]
+
+
+def split_large_files(
+    files: list, files_info: dict, npartitions: int, stepsize: int, balance_by: str
+) -> tuple:
+    """
+    split the files whose cost exceeds the mean partition cost into
+    {"file", "entry_start", "entry_stop"} entry ranges, aligned to stepsize,
+    so that a single file does not dominate the runtime of a partition
+
+    Returns:
+        items: file paths and entry ranges
+        costs: cost of each item (range costs are proportional to their entries)
+    """
+    costs = [files_info[path][balance_by] for path in files]
+    target = sum(costs) / max(npartitions, 1)
+    items, item_costs = [], []
+    for path, cost in zip(files, costs):
+        entries = files_info[path]["entries"]
+        nsplits = int(np.ceil(cost / target)) if target > 0 else 1
+        if nsplits <= 1 or entries <= stepsize:
+            items.append(path)
+            item_costs.append(cost)
+            continue
+        range_size = int(np.ceil(entries / nsplits / stepsize)) * stepsize
+        for start in range(0, entries, range_size):
+            stop = min(start + range_size, entries)
+            items.append({"file": path, "entry_start": start, "entry_stop": stop})
+            item_costs.append(cost * (stop - start) / entries)
+    return items, item_costs
+
+
+def consistent_partitions(
+    items: list, costs: list, n: int, load_factor: float = 1.25, replicas: int = 64
+) -> list:
+    """
+    assign items to n partitions with consistent hashing with bounded loads:
+    each partition owns `replicas` points of a hash ring and items, taken in
+    the order of their hash, go to the first partition clockwise whose total
+    cost stays below load_factor times the mean partition cost. Items larger
+    than that go to the first empty partition clockwise. The partition of an
+    item only depends on its name and on the items before it on the ring, so
+    adding or removing files moves few other files. Partitions that end up
+    empty are dropped
+    """
+    n = max(min(n, len(items)), 1)
+
+    def position(name: str) -> int:
+        return int(hashlib.sha256(name.encode()).hexdigest()[:16], 16)
+
+    def item_name(item) -> str:
+        if isinstance(item, dict):
+            return f"{item['file']}:{item['entry_start']}:{item['entry_stop']}"
+        return item
+
+    ring = sorted(
+        (position(f"partition-{i}-{replica}"), i) for i in range(n) for replica in range(replicas)
+    )
+    ring_positions = [point for point, _ in ring]
+    capacity = load_factor * sum(costs) / n
+    loads = [0.0] * n
+    assignment = [[] for _ in range(n)]
+    for index in sorted(range(len(items)), key=lambda i: position(item_name(items[i]))):
+        start = bisect.bisect(ring_positions, position(item_name(items[index])))
+        for step in range(len(ring)):
+            partition = ring[(start + step) % len(ring)][1]
+            if loads[partition] + costs[index] <= capacity or loads[partition] == 0:
+                break
+        else:
+            partition = int(np.argmin(loads))
+        loads[partition] += costs[index]
+        assignment[partition].append(index)
+    return [[items[i] for i in sorted(indices)] for indices in assignment if indices]
+
+
+def partition_count(entries: int, time_per_event: float, workers: int, target_duration: float) -> int:
+    """number of partitions for jobs of target_duration seconds running with workers"""
+    return max(int(np.ceil(entries * time_per_event / max(workers, 1) / target_duration)), 1)
+
+
 def build_filesets(args: dict) -> None:
     """
     build filesets partitions for an specific sample fileset
+
+    args['partitioning'] selects how files are split:
+        count: dataset config partitions with the same number of files
+        balanced: files bin-packed by their number of entries (or bytes,
+            args['balance_by']) read from the cached file index. Files larger
+            than the mean partition are split into entry ranges
+        stable: files assigned with consistent hashing with bounded loads,
+            so adding files to the sample only changes a few partitions
+    With balanced or stable partitioning and args['target_duration'], the
+    number of partitions is chosen to have jobs of that duration (in seconds)
+    given args['time_per_event']
+
+    Returns:
+        filesets: {key: partition fileset path}
+        changed: keys of the partitions that were (re)written
     """
     main_dir = Path.cwd()
 
     # make output filesets directory
     fileset_path = Path(f"{main_dir}/analysis/filesets")
     output_directory = Path(f"{fileset_path}/{args['year']}/")
-    if output_directory.exists():
-        for file in output_directory.glob(f"{args['sample']}*"):
-            if file.is_file():
-                file.unlink()
-    else:
-        output_directory.mkdir(parents=True)
+    output_directory.mkdir(parents=True, exist_ok=True)
     # read json file with PFNano fileset
     json_file = f"{fileset_path}/fileset_{args['year']}_PFNANO.json"
     with open(json_file, "r") as handle:
         root_files = json.load(handle)[args["sample"]]
     # generate and save fileset partitions
-    filesets = {}
     dataset_config = load_config(
         config_type="dataset", config_name=args["sample"], year=args["year"]
     )
-    if dataset_config.partitions == 1:
-        filesets[args["sample"]] = f"{output_directory}/{args['sample']}.json"
-        sample_data = {args["sample"]: root_files}
-        with open(f"{output_directory}/{args['sample']}.json", "w") as json_file:
-            json.dump(sample_data, json_file, indent=4, sort_keys=True)
+    npartitions = dataset_config.partitions
+    partitioning = args.get("partitioning", "count")
+    if partitioning in ["balanced", "stable"]:
+        index = FileIndex(f"{fileset_path}/index_{args['year']}.json")
+        files_info = index.get(root_files)
+        if args.get("target_duration"):
+            npartitions = partition_count(
+                sum(info["entries"] for info in files_info.values()),
+                args["time_per_event"],
+                args["workers"],
+                args["target_duration"],
+            )
+        balance_by = args.get("balance_by", "entries")
+        if partitioning == "balanced":
+            items, costs = split_large_files(
+                root_files, files_info, npartitions, dataset_config.stepsize, balance_by
+            )
+            root_files_list = balanced_partitions(items, costs, npartitions)
+        else:
+            costs = [files_info[root_file][balance_by] for root_file in root_files]
+            root_files_list = consistent_partitions(root_files, costs, npartitions)
+    else:
+        root_files_list = divide_list(root_files, npartitions)
+    # no jobs for empty partitions (e.g. more partitions than files)
+    root_files_list = [files for files in root_files_list if files]
+    npartitions = len(root_files_list)
+    if npartitions == 1:
+        partitions = {args["sample"]: root_files}
     else:
-        root_files_list = divide_list(root_files, dataset_config.partitions)
         keys = ".".join(
-            f"{args['sample']}_{i}" for i in range(1, dataset_config.partitions + 1)
+            f"{args['sample']}_{i}" for i in range(1, npartitions + 1)
         ).split(".")
-        for key, value in zip(keys, root_files_list):
-            sample_data = {}
-            sample_data[key] = list(value)
+        partitions = {key: list(value) for key, value in zip(keys, root_files_list)}
 
-            filesets[key] = f"{output_directory}/{key}.json"
-            with open(f"{output_directory}/{key}.json", "w") as json_file:
-                json.dump(sample_data, json_file, indent=4, sort_keys=True)
\ No newline at end of file
+    # only the partitions whose files changed are rewritten, stale ones are removed
+    filesets, changed = {}, []
+    for file in output_directory.glob(f"{args['sample']}*.json"):
+        prefix, _, suffix = file.stem.rpartition("_")
+        is_partition = prefix == args["sample"] and suffix.isdigit()
+        if (file.stem == args["sample"] or is_partition) and file.stem not in partitions:
+            file.unlink()
+    for key, value in partitions.items():
+        sample_data = {key: value}
+        filesets[key] = f"{output_directory}/{key}.json"
+        if Path(filesets[key]).exists():
+            with open(filesets[key], "r") as json_file:
+                if json.load(json_file) == sample_data:
+                    continue
+        changed.append(key)
+        with open(filesets[key], "w") as json_file:
+            json.dump(sample_data, json_file, indent=4, sort_keys=True)
+    return filesets, changed
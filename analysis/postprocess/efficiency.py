@@ -0,0 +1,209 @@
+import hist
+import numpy as np
+from hist.intervals import clopper_pearson_interval
+
+
+def _flow_slice(axis) -> slice:
+    """slice selecting the in-range bins of an axis in a flow=True view"""
+    start = 1 if axis.traits.underflow else 0
+    return slice(start, start + axis.size)
+
+
+def _threshold_index(axis, threshold: float) -> int:
+    """
+    index (in the flow=True view) of the first bin whose lower edge is
+    greater or equal than the threshold
+    """
+    offset = 1 if axis.traits.underflow else 0
+    index = int(np.searchsorted(axis.edges, threshold, side="left")) + offset
+    # thresholds above the last edge can only be evaluated on the overflow bin
+    return min(index, len(axis.edges) - 1 + offset)
+
+
+def efficiency_from_discriminant(
+    histogram: hist.Hist, working_points: dict
+) -> dict:
+    """
+    compute passing and total jet counts for arbitrary working points from a
+    discriminant-space histogram filled by TaggingEfficiencyProcessor with
+    mode='discriminant'
+
+    Parameters:
+        histogram: histogram with one axis per discriminant
+        working_points: {wp: {discriminant: threshold}}, e.g. the tagger entry
+            of analysis.configs.working_points.WORKING_POINTS
+
+    Returns:
+        {wp: {"pass": Hist, "total": Hist, "thresholds": {discriminant: edge}}}
+        where the histograms keep the non-discriminant axes and 'thresholds'
+        holds the bin edges actually used (thresholds are rounded up to the
+        next bin edge when they don't coincide with one)
+    """
+    discriminants = list(next(iter(working_points.values())))
+    axes_names = [axis.name for axis in histogram.axes]
+    disc_idx = [axes_names.index(discriminant) for discriminant in discriminants]
+    other_axes = [axis for axis in histogram.axes if axis.name not in discriminants]
+
+    values = histogram.view(flow=True)
+    if values.dtype.names is not None:
+        values = values["value"]
+
+    # move discriminant axes to the end and compute suffix (reverse prefix) sums
+    # along them, so cumulative[..., i, j] = jets with disc_1 >= edge_i & disc_2 >= edge_j
+    n_other = len(other_axes)
+    cumulative = np.moveaxis(values, disc_idx, list(range(n_other, values.ndim)))
+    for axis in range(n_other, cumulative.ndim):
+        cumulative = np.flip(np.cumsum(np.flip(cumulative, axis), axis=axis), axis)
+
+    # total counts are the first entry (underflow included) of every suffix sum
+    total = cumulative[(...,) + (0,) * len(discriminants)]
+
+    # look up all working points at once
+    wps = list(working_points)
+    thresholds_idx = [
+        np.array(
+            [
+                _threshold_index(histogram.axes[d], working_points[wp][d])
+                for wp in wps
+            ]
+        )
+        for d in discriminants
+    ]
+    passed = cumulative[(...,) + tuple(thresholds_idx)]
+
+    in_range = tuple(_flow_slice(axis) for axis in other_axes)
+    output = {}
+    for i, wp in enumerate(wps):
+        output[wp] = {"thresholds": {}}
+        for name, counts in [("pass", passed[..., i]), ("total", total)]:
+            counts_hist = hist.Hist(*other_axes)
+            counts_hist.view(flow=False)[...] = counts[in_range]
+            output[wp][name] = counts_hist
+        for d, idx in zip(discriminants, thresholds_idx):
+            axis = histogram.axes[d]
+            edge = idx[i] - (1 if axis.traits.underflow else 0)
+            output[wp]["thresholds"][d] = float(axis.edges[edge])
+    return output
+
+
+def _efficiency_interval(passed: np.ndarray, total: np.ndarray) -> tuple:
+    """efficiency and Clopper-Pearson (68%) interval, empty bins get eff=0 and [0, 1]"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        efficiency = np.where(total > 0, passed / total, 0.0)
+        down, up = clopper_pearson_interval(passed, total)
+    down = np.where(total > 0, np.nan_to_num(down, nan=0.0), 0.0)
+    up = np.where(total > 0, np.nan_to_num(up, nan=1.0), 1.0)
+    return efficiency, down, up
+
+
+def _efficiency_map(passed: hist.Hist, total: hist.Hist) -> dict:
+    """efficiency map over (flavor, pt, eta) from pass and total histograms"""
+    passed = passed.project("flavor", "pt", "eta")
+    total = total.project("flavor", "pt", "eta")
+    efficiency, down, up = _efficiency_interval(passed.values(), total.values())
+    return {
+        "flavor": [int(flavor) for flavor in passed.axes["flavor"]],
+        "pt": passed.axes["pt"].edges.tolist(),
+        "eta": passed.axes["eta"].edges.tolist(),
+        "nominal": efficiency,
+        "down": down,
+        "up": up,
+    }
+
+
+def build_efficiency_maps(histograms: dict, working_points: dict) -> dict:
+    """
+    compute tagging efficiency maps from merged tag_eff histograms
+
+    Parameters:
+        histograms: merged 'histograms' output of TaggingEfficiencyProcessor,
+            either in 'wp' mode ({"eff": Hist}) or 'discriminant' mode
+            ({"<tagger>_<flavor>": Hist})
+        working_points: {flavor: {tagger: {wp: {discriminant: threshold}}}}
+            working points to evaluate in 'discriminant' mode
+
+    Returns:
+        {"<tagger>_<flavor>_<wp>": efficiency map}
+    """
+    maps = {}
+    if "eff" in histograms:
+        histogram = histograms["eff"]
+        for tagger in histogram.axes["tagger"]:
+            for flavor in histogram.axes["tag_flavor"]:
+                for wp in histogram.axes["wp"]:
+                    selection = histogram[
+                        {"tagger": tagger, "tag_flavor": flavor, "wp": wp}
+                    ]
+                    maps[f"{tagger}_{flavor}_{wp}"] = _efficiency_map(
+                        passed=selection[{"pass_wp": hist.loc(1)}],
+                        total=selection[{"pass_wp": sum}],
+                    )
+        return maps
+
+    for key, histogram in histograms.items():
+        tagger, flavor = key.split("_")
+        counts = efficiency_from_discriminant(
+            histogram, working_points[flavor][tagger]
+        )
+        for wp, wp_counts in counts.items():
+            maps[f"{tagger}_{flavor}_{wp}"] = _efficiency_map(
+                passed=wp_counts["pass"], total=wp_counts["total"]
+            )
+    return maps
+
+
+def to_correction_json(maps: dict, description: str = "") -> dict:
+    """
+    convert efficiency maps to a correctionlib (schema v2) style dictionary.
+    Each map is a correction with inputs (systematic, flavor, pt, eta)
+    """
+    corrections = []
+    for name, efficiency_map in maps.items():
+        content = []
+        for systematic in ["nominal", "down", "up"]:
+            flavor_content = []
+            for i, flavor in enumerate(efficiency_map["flavor"]):
+                flavor_content.append(
+                    {
+                        "key": flavor,
+                        "value": {
+                            "nodetype": "multibinning",
+                            "inputs": ["pt", "eta"],
+                            "edges": [efficiency_map["pt"], efficiency_map["eta"]],
+                            "content": np.asarray(efficiency_map[systematic][i])
+                            .ravel()
+                            .tolist(),
+                            "flow": "clamp",
+                        },
+                    }
+                )
+            content.append(
+                {
+                    "key": systematic,
+                    "value": {
+                        "nodetype": "category",
+                        "input": "flavor",
+                        "content": flavor_content,
+                    },
+                }
+            )
+        corrections.append(
+            {
+                "name": name,
+                "description": description,
+                "version": 1,
+                "inputs": [
+                    {"name": "systematic", "type": "string"},
+                    {"name": "flavor", "type": "int", "description": "hadronFlavour"},
+                    {"name": "pt", "type": "real"},
+                    {"name": "eta", "type": "real"},
+                ],
+                "output": {"name": "efficiency", "type": "real"},
+                "data": {
+                    "nodetype": "category",
+                    "input": "systematic",
+                    "content": content,
+                },
+            }
+        )
+    return {"schema_version": 2, "corrections": corrections}
@@ -0,0 +1,215 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from coffea.processor import accumulate
+from analysis.configs.load_config import load_config
+from analysis.execution.outputs import histograms_files, tmp_path
+from analysis.execution.store import write_histograms
+from analysis.postprocess.utils import load_histograms
+
+
+def sample_name(key: str, year: str) -> str:
+    """sample of a fileset key: the key itself or the sample of a '{sample}_{i}' partition"""
+    for name in [key, key.rsplit("_", 1)[0]]:
+        try:
+            load_config(config_type="dataset", config_name=name, year=year)
+        except Exception:
+            continue
+        return name
+    prefix, _, suffix = key.rpartition("_")
+    return prefix if prefix and suffix.isdigit() else key
+
+
+def sample_filesets(sample: str, year: str, filesets_path: str) -> dict:
+    """{key: files} of the partition filesets of a sample in <filesets_path>/<year>"""
+    fileset = {}
+    for path in Path(filesets_path).glob(f"{year}/{sample}*.json"):
+        if path.stem == sample or sample_name(path.stem, year) == sample:
+            with open(path, "r") as f:
+                fileset.update(json.load(f))
+    return fileset
+
+
+def expected_partitions(sample: str, year: str, filesets_path: str) -> set:
+    """
+    fileset keys of a sample: the keys of the partition filesets built by
+    submit_condor.py or, without them, the keys implied by the dataset config.
+    Empty set if neither is available
+    """
+    keys = set(sample_filesets(sample, year, filesets_path))
+    if keys:
+        return keys
+    try:
+        config = load_config(config_type="dataset", config_name=sample, year=year)
+    except Exception:
+        return set()
+    if config.partitions == 1:
+        return {sample}
+    return {f"{sample}_{i}" for i in range(1, config.partitions + 1)}
+
+
+def discover_outputs(input_path: str, year: str, processor: str = "*") -> dict:
+    """
+    find the submit.py outputs under <input_path>/<processor>/<year>/...
+
+    Returns:
+        {(output directory relative to input_path, sample): {key: (histograms file, metadata)}}
+    """
+    groups = defaultdict(dict)
+    for metadata_file in sorted(Path(input_path).glob(f"{processor}/{year}/**/*_metadata.json")):
+        key = metadata_file.name[: -len("_metadata.json")]
+        files = histograms_files(metadata_file.parent, key)
+        if not files:
+            continue
+        with open(metadata_file, "r") as f:
+            metadata = json.load(f)
+        directory = str(metadata_file.parent.relative_to(input_path))
+        groups[(directory, sample_name(key, year))][key] = (str(files[0]), metadata)
+    return dict(groups)
+
+
+def check_partitions(groups: dict, year: str, filesets_path: str, samples: list = None) -> dict:
+    """
+    compare the discovered outputs with the expected partitions of each sample.
+    Requested samples without any output in a directory of the discovered
+    outputs have all their partitions missing
+
+    Returns:
+        {(directory, sample): {"missing": [keys], "stale": [keys], "quicklook": [keys]}}
+        for the samples with problems. 'stale' outputs were produced from a
+        different file list than the current partition fileset
+    """
+    groups = dict(groups)
+    for directory in {directory for directory, _ in groups}:
+        for sample in samples or []:
+            groups.setdefault((directory, sample), {})
+    problems = {}
+    for (directory, sample), outputs in groups.items():
+        expected = expected_partitions(sample, year, filesets_path)
+        missing = sorted(expected - set(outputs))
+        stale = []
+        for key, files in sample_filesets(sample, year, filesets_path).items():
+            if key in outputs and {json.dumps(f, sort_keys=True) for f in files} != {
+                json.dumps(f, sort_keys=True) for f in outputs[key][1]["fileset"]
+            }:
+                stale.append(key)
+        quicklook = sorted(key for key, (_, m) in outputs.items() if "quicklook" in m)
+        if missing or stale or quicklook:
+            problems[(directory, sample)] = {
+                "missing": missing,
+                "stale": sorted(stale),
+                "quicklook": quicklook,
+            }
+    return problems
+
+
+def merge_metadata(outputs: dict) -> dict:
+    """sum the sumw, nevents and cputime of the partitions metadata"""
+    metadata = {"partitions": sorted(outputs), "fileset": []}
+    for key in sorted(outputs):
+        partition_metadata = outputs[key][1]
+        metadata["fileset"] += partition_metadata["fileset"]
+        for field in ["sumw", "nevents", "cputime"]:
+            if field in partition_metadata:
+                metadata[field] = metadata.get(field, 0) + partition_metadata[field]
+    return metadata
+
+
+def _merge_files(paths: list, output_file: str) -> str:
+    """merge histograms files one at a time into a single accumulator"""
+    merged = None
+    for path in paths:
+        histograms = load_histograms(path)
+        merged = histograms if merged is None else accumulate([histograms], merged)
+    write_histograms(merged, output_file)
+    return output_file
+
+
+def tree_merge(groups: dict, tmp_dir: str, workers: int, fan_in: int) -> dict:
+    """
+    merge each group of histograms files into one file with a parallel tree
+    reduction: every level merges batches of at most fan_in files, so a worker
+    holds at most two sets of histograms in memory
+
+    Parameters:
+        groups: {name: [histograms files]}
+        tmp_dir: directory for the intermediate (and final) merged files
+        workers: number of merging processes
+        fan_in: number of files merged by a task
+
+    Returns:
+        {name: merged file in tmp_dir}
+    """
+    fan_in = max(fan_in, 2)
+    groups = {name: list(paths) for name, paths in groups.items()}
+    intermediate = set()
+    level = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while level == 0 or any(len(paths) > 1 for paths in groups.values()):
+            futures = {}
+            for name, paths in groups.items():
+                if level > 0 and len(paths) == 1:
+                    continue
+                prefix = hashlib.sha256(name.encode()).hexdigest()[:16]
+                for i in range(0, len(paths), fan_in):
+                    output_file = f"{tmp_dir}/{prefix}_{level}_{i // fan_in}.npz"
+                    future = pool.submit(_merge_files, paths[i : i + fan_in], output_file)
+                    futures[future] = (name, i // fan_in, paths[i : i + fan_in])
+            merged = defaultdict(dict)
+            for future, (name, batch, paths) in futures.items():
+                merged[name][batch] = future.result()
+                for path in intermediate.intersection(paths):
+                    os.remove(path)
+                    intermediate.discard(path)
+            for name, batches in merged.items():
+                groups[name] = [batches[batch] for batch in sorted(batches)]
+                intermediate.update(groups[name])
+            level += 1
+    return {name: paths[0] for name, paths in groups.items()}
+
+
+def merge_outputs(
+    groups: dict,
+    output_path: str,
+    workers: int = 4,
+    fan_in: int = 8,
+) -> dict:
+    """
+    merge the partition outputs of each sample into <output_path>/<directory>/<sample>.npz
+    with the summed metadata in <sample>_metadata.json
+
+    Parameters:
+        groups: outputs found by discover_outputs
+
+    Returns:
+        {(directory, sample): merged metadata}
+    """
+    # own temporary directory, several merges (e.g. DAG merge nodes) can write to the same output path
+    Path(output_path).mkdir(parents=True, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=output_path, prefix=".merge_")
+    names = {f"{directory}/{sample}": (directory, sample) for directory, sample in groups}
+    files = {
+        name: [groups[group][key][0] for key in sorted(groups[group])]
+        for name, group in names.items()
+    }
+    merged_files = tree_merge(files, tmp_dir, workers, fan_in)
+    merged_metadata = {}
+    for name, merged_file in merged_files.items():
+        directory, sample = names[name]
+        sample_path = Path(f"{output_path}/{directory}")
+        sample_path.mkdir(parents=True, exist_ok=True)
+        os.replace(merged_file, sample_path / f"{sample}.npz")
+        metadata = merge_metadata(groups[(directory, sample)])
+        metadata_file = sample_path / f"{sample}_metadata.json"
+        tmp_file = tmp_path(metadata_file)
+        with open(tmp_file, "w") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_file, metadata_file)
+        merged_metadata[(directory, sample)] = metadata
+    shutil.rmtree(tmp_dir)
+    return merged_metadata
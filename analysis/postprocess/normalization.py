@@ -0,0 +1,105 @@
+import json
+import hist
+from pathlib import Path
+from coffea.processor import accumulate
+from analysis.configs.load_config import load_config
+from analysis.configs.processes import PROCESSES
+from analysis.execution.store import write_histograms
+from analysis.postprocess.utils import load_histograms
+
+
+def scale_histogram(histogram: hist.Hist, scale: float) -> hist.Hist:
+    """
+    scale the values of a histogram by scale and its variances by scale**2,
+    operating on the whole bin contents view. Weight histograms are scaled in
+    place, Double/Int64 histograms (whose variances are the counts) are
+    converted to Weight storage. Mean storages are returned unchanged
+    """
+    view = histogram.view(flow=True)
+    if view.dtype.names == ("value", "variance"):
+        view["value"] *= scale
+        view["variance"] *= scale**2
+        return histogram
+    if view.dtype.names:
+        return histogram
+    scaled = hist.Hist(*histogram.axes, storage=hist.storage.Weight())
+    scaled_view = scaled.view(flow=True)
+    scaled_view["value"] = view * scale
+    scaled_view["variance"] = view * scale**2
+    return scaled
+
+
+def sample_scale(sample: str, year: str, sumw: float, luminosity: float) -> dict:
+    """xsec * luminosity / sumw of an MC sample (1 for data)"""
+    config = load_config(config_type="dataset", config_name=sample, year=year)
+    if not config.is_mc:
+        return {"xsec": None, "luminosity": luminosity, "sumw": sumw, "scale": 1.0}
+    if not sumw:
+        raise ValueError(
+            f"Sample {sample} has sumw={sumw}, it cannot be normalized (empty or quick-look output?)"
+        )
+    return {
+        "xsec": config.xsec,
+        "luminosity": luminosity,
+        "sumw": sumw,
+        "scale": config.xsec * luminosity / sumw,
+    }
+
+
+def process_name(sample: str, processes: dict = None) -> str:
+    """process a sample is stacked into (the sample itself if it is not in processes)"""
+    for process, samples in (processes or PROCESSES).items():
+        if sample in samples:
+            return process
+    return sample
+
+
+def normalize_outputs(
+    path: str,
+    samples: dict,
+    year: str,
+    luminosity: float,
+    processes: dict = None,
+) -> dict:
+    """
+    normalize the merged outputs of a directory to xsec * luminosity / sumw.
+    In a single pass over the samples, each sample is scaled and written to
+    <path>/normalized/<sample>.npz and added to the total of its process,
+    written to <path>/processes/<process>.npz. The scales and the process
+    composition are saved in <path>/normalization.json
+
+    Parameters:
+        path: directory with the merged <sample>.npz outputs
+        samples: {sample: merged metadata}, samples without sumw are skipped
+        year: dataset config year
+        luminosity: integrated luminosity in pb^-1
+        processes: {process: [samples]} (default analysis/configs/processes.py)
+
+    Returns:
+        normalization: {"samples": {sample: scale info}, "processes": {process: [samples]}}
+    """
+    normalization = {"samples": {}, "processes": {}}
+    totals = {}
+    for sample in sorted(samples):
+        if "sumw" not in samples[sample]:
+            continue
+        normalization["samples"][sample] = sample_scale(
+            sample, year, samples[sample]["sumw"], luminosity
+        )
+        scale = normalization["samples"][sample]["scale"]
+        histograms = {
+            name: scale_histogram(histogram, scale)
+            for name, histogram in load_histograms(f"{path}/{sample}.npz").items()
+        }
+        Path(f"{path}/normalized").mkdir(parents=True, exist_ok=True)
+        write_histograms(histograms, f"{path}/normalized/{sample}.npz")
+
+        process = process_name(sample, processes)
+        normalization["processes"].setdefault(process, []).append(sample)
+        totals[process] = accumulate([histograms], totals.get(process))
+    Path(f"{path}/processes").mkdir(parents=True, exist_ok=True)
+    for process, total in totals.items():
+        write_histograms(total, f"{path}/processes/{process}.npz")
+    with open(f"{path}/normalization.json", "w") as f:
+        json.dump(normalization, f, indent=2)
+    return normalization
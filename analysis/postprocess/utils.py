@@ -0,0 +1,21 @@
+import pickle
+from pathlib import Path
+from coffea.processor import accumulate
+from analysis.execution.store import HistogramStore
+
+
+def load_histograms(path: str) -> dict:
+    """load the histograms saved by submit.py (.npz or .pkl)"""
+    if Path(path).suffix == ".npz":
+        return dict(HistogramStore(path))
+    with open(path, "rb") as handle:
+        return pickle.load(handle)
+
+
+def merge_histograms(paths: list) -> dict:
+    """load and merge (sum) the histograms of several submit.py outputs"""
+    merged = None
+    for path in paths:
+        histograms = load_histograms(path)
+        merged = histograms if merged is None else accumulate([histograms], merged)
+    return merged
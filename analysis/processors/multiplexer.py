@@ -0,0 +1,33 @@
+import time
+from coffea import processor
+
+
+class ProcessorMultiplexer(processor.ProcessorABC):
+    """
+    Run several processors over the same chunk
+
+    All processors receive the same events object, so every column is read
+    from the file once per chunk (NanoEvents keeps loaded columns in a
+    per-chunk cache) even if it is used by several processors. Outputs are
+    kept separate and the CPU time spent in each processor is accumulated
+    by dataset.
+
+    Attributes:
+        processors: {name: processor instance}
+    """
+
+    def __init__(self, processors: dict):
+        self.processors = processors
+
+    def process(self, events):
+        dataset = events.metadata["dataset"]
+        output = {"outputs": {}, "cputime": {}}
+        for name, processor_instance in self.processors.items():
+            t0 = time.process_time()
+            output["outputs"][name] = processor_instance.process(events)
+            output["cputime"][name] = {dataset: time.process_time() - t0}
+        return output
+
+    def postprocess(self, accumulator):
+        for name, processor_instance in self.processors.items():
+            processor_instance.postprocess(accumulator["outputs"][name])
@@ -4,13 +4,29 @@ import numpy as np
 import awkward as ak
 from coffea import processor
 from analysis.processors.utils import normalize
+from analysis.configs.working_points import WorkingPointMasks
+from analysis.corrections.tag_eff import EfficiencyLookup, tagging_event_weight
 from coffea.analysis_tools import PackedSelection, Weights
 
 
 class SignalProcessor(processor.ProcessorABC):
-    def __init__(self, year):
+    def __init__(self, year, efficiency_maps=None, scale_factors=None):
         self.year = year
 
+        # c-tagging event weights are computed when the MC tagging efficiency
+        # maps (make_efficiency_maps.py) and the data/MC scale factors (same
+        # format) are provided
+        if (efficiency_maps is None) != (scale_factors is None):
+            raise ValueError(
+                "efficiency_maps and scale_factors have to be provided together"
+            )
+        self.efficiency_maps = (
+            EfficiencyLookup.from_json(efficiency_maps) if efficiency_maps else None
+        )
+        self.scale_factors = (
+            EfficiencyLookup.from_json(scale_factors) if scale_factors else None
+        )
+
         region_axis = hist.axis.StrCategory([], name="region", growth=True)
 
         higgs_mass_axis = hist.axis.Regular(
@@ -145,19 +161,35 @@ class SignalProcessor(processor.ProcessorABC):
         # -----------------------------
         # impose some quality and minimum pt cuts on jets
         jets = events.Jet
-        jets = jets[(jets.pt >= 30) & (np.abs(jets.eta) < 2.5) & (jets.jetId == 6)]
-        jets = jets[ak.all(jets.metric_table(muons) > 0.4, axis=-1)]
+        jets_selection = (
+            (jets.pt >= 30) & (np.abs(jets.eta) < 2.5) & (jets.jetId == 6)
+        )
+        jets = jets[jets_selection]
+        cleaning_selection = ak.all(jets.metric_table(muons) > 0.4, axis=-1)
+        jets = jets[cleaning_selection]
         # get cjets using deepjet, particlenet and partRobust taggers
+        working_points_mask = WorkingPointMasks.from_events(events, self.year)
         tagger_jets = {
-            "deepjet": jets[
-                (jets.btagDeepFlavCvB > 0.241) & (jets.btagDeepFlavCvL > 0.305)
-            ],
-            "pnet": jets[(jets.btagPNetCvB > 0.258) & (jets.btagPNetCvL > 0.491)],
-            "part": jets[
-                (jets.btagRobustParTAK4CvB > 0.095)
-                & (jets.btagRobustParTAK4CvL > 0.358)
-            ],
+            tagger: jets[
+                working_points_mask["c", tagger, "tight"][jets_selection][
+                    cleaning_selection
+                ]
+            ]
+            for tagger in ["deepjet", "pnet", "part"]
         }
+        # c-tagging event weights
+        tagging_weights = {}
+        if is_mc and self.efficiency_maps is not None:
+            for tagger in tagger_jets:
+                name = f"{tagger}_c_tight"
+                tagged = working_points_mask["c", tagger, "tight"][jets_selection][
+                    cleaning_selection
+                ]
+                tagging_weights[tagger] = tagging_event_weight(
+                    efficiency=self.efficiency_maps.evaluate_jets(name, jets),
+                    tagged=tagged,
+                    scale_factor=self.scale_factors.evaluate_jets(name, jets),
+                )
         # -----------------------------
         # event selection
         # -----------------------------
@@ -214,6 +246,10 @@ class SignalProcessor(processor.ProcessorABC):
             }
             # get region weights
             region_weights = weights_container.weight()[region_selection]
+            if region in tagging_weights:
+                region_weights = (
+                    region_weights * tagging_weights[region][region_selection]
+                )
             # fill histograms
             for feature, array in features.items():
                 fill_args = {
@@ -1,90 +1,175 @@
 import hist
+import itertools
+import numpy as np
 import awkward as ak
 from coffea import processor
+from analysis.configs.working_points import WORKING_POINTS, WorkingPointMasks
+from analysis.processors.utils import flat_fields, category_lut, fill_indices
 
 
 class TaggingEfficiencyProcessor(processor.ProcessorABC):
-    def __init__(self, wp="tight", tagger="pnet", flavor="c", year="2022"):
+    """
+    Fill jet tagging efficiency histograms
+
+    tagger, flavor and wp can be set to 'all' in order to fill every
+    combination in a single pass over the data. The requested combinations
+    are stored in the 'tagger', 'tag_flavor' and 'wp' axes of the histogram
+
+    with mode='discriminant' the working point decision is not applied.
+    Instead, one histogram per tagger and flavor is filled with the
+    discriminant values (CvB, CvL or B) in fine bins, so the efficiency of
+    any threshold can be computed afterwards
+    (see analysis.postprocess.efficiency)
+    """
+
+    def __init__(
+        self,
+        wp="tight",
+        tagger="pnet",
+        flavor="c",
+        year="2022EE",
+        mode="wp",
+        discriminant_bins=50,
+    ):
+        if mode not in ["wp", "discriminant"]:
+            raise ValueError(f"Invalid mode '{mode}'. Choose between 'wp' and 'discriminant'")
         self.wp = wp
         self.tagger = tagger
         self.flavor = flavor
         self.year = year
+        self.mode = mode
+        self.discriminant_bins = discriminant_bins
+
+        working_points = WORKING_POINTS.get(self.year)
+        if not working_points:
+            raise ValueError(f"No working points defined for year={self.year}")
+        self.flavors = list(working_points) if flavor == "all" else [flavor]
+        self.taggers = (
+            list(working_points[self.flavors[0]]) if tagger == "all" else [tagger]
+        )
+        self.wps = (
+            list(working_points[self.flavors[0]][self.taggers[0]])
+            if wp == "all"
+            else [wp]
+        )
+
+        self.pt_axis = hist.axis.Variable(
+            [20, 30, 50, 70, 100, 140, 200, 300, 600, 1000], name="pt"
+        )
+        self.eta_axis = hist.axis.Regular(10, -2.5, 2.5, name="eta")
+        self.flavor_axis = hist.axis.IntCategory([0, 4, 5], name="flavor")
+        self.flavor_lut = category_lut(self.flavor_axis).astype(np.int16)
+
+    def discriminant_edges(self, flavor, tagger):
+        """
+        discriminant bin edges for each discriminant of a tagger. Known working
+        points thresholds are added to the regular edges so they are exact
+        """
+        working_points = WORKING_POINTS[self.year][flavor][tagger]
+        edges = {}
+        for discriminant in next(iter(working_points.values())):
+            thresholds = [wp[discriminant] for wp in working_points.values()]
+            edges[discriminant] = np.unique(
+                np.concatenate(
+                    [np.linspace(0, 1, self.discriminant_bins + 1), thresholds]
+                )
+            )
+        return edges
+
+    def jet_bins(self, events, fields=()):
+        """
+        flat jet features, tagging phase space mask and (pt, eta, flavor) bin
+        indices of the jets within the phase space. Jet fields are extracted
+        in a single flatten and are views of the jets content buffers
+        """
+        jets = flat_fields(events.Jet, ["pt", "eta", "hadronFlavour", *fields])
+        phasespace_cuts = (np.abs(jets["eta"]) < 2.5) & (jets["pt"] > 20.0)
+        # small integer bin indices, the flat histogram index is built at filling
+        indices = {
+            "pt": self.pt_axis.index(jets["pt"]).astype(np.int16)[phasespace_cuts],
+            "eta": self.eta_axis.index(jets["eta"]).astype(np.int16)[phasespace_cuts],
+            "flavor": np.take(self.flavor_lut, jets["hadronFlavour"], mode="clip")[
+                phasespace_cuts
+            ],
+        }
+        return phasespace_cuts, jets, indices
 
     def process(self, events):
+        if self.mode == "discriminant":
+            return self.process_discriminant(events)
+
         dataset = events.metadata["dataset"]
 
         eff_histogram = hist.Hist(
-            hist.axis.StrCategory([], growth=True, name="dataset"),
-            hist.axis.Variable(
-                [20, 30, 50, 70, 100, 140, 200, 300, 600, 1000], name="pt"
-            ),
-            hist.axis.Regular(10, -2.5, 2.5, name="eta"),
-            hist.axis.IntCategory([0, 4, 5], name="flavor"),
+            hist.axis.StrCategory([dataset], growth=True, name="dataset"),
+            hist.axis.StrCategory(self.taggers, name="tagger"),
+            hist.axis.StrCategory(self.flavors, name="tag_flavor"),
+            hist.axis.StrCategory(self.wps, name="wp"),
+            self.pt_axis,
+            self.eta_axis,
+            self.flavor_axis,
             hist.axis.IntCategory([0, 1], name="pass_wp"),
         )
 
-        phasespace_cuts = (abs(events.Jet.eta) < 2.5) & (events.Jet.pt > 20.0)
-        jets = events.Jet[phasespace_cuts]
-
-        working_points_mask = {
-            "2022EE": {
-                # https://indico.cern.ch/event/1304360/contributions/5518916/attachments/2692786/4673101/230731_BTV.pdf
-                "c": {
-                    "deepjet": {
-                        "loose": (jets.btagDeepFlavCvB > 0.206)
-                        & (jets.btagDeepFlavCvL > 0.042),
-                        "medium": (jets.btagDeepFlavCvB > 0.298)
-                        & (jets.btagDeepFlavCvL > 0.108),
-                        "tight": (jets.btagDeepFlavCvB > 0.241)
-                        & (jets.btagDeepFlavCvL > 0.305),
-                    },
-                    "pnet": {
-                        "loose": (jets.btagPNetCvB > 0.182) & (jets.btagPNetCvL > 0.054),
-                        "medium": (jets.btagPNetCvB > 0.304) & (jets.btagPNetCvL > 0.160),
-                        "tight": (jets.btagPNetCvB > 0.258) & (jets.btagPNetCvL > 0.491),
-                    },
-                    "part": {
-                        "loose": (jets.btagRobustParTAK4CvB > 0.067)
-                        & (jets.btagRobustParTAK4CvL > 0.0390),
-                        "medium": (jets.btagRobustParTAK4CvB > 0.128)
-                        & (jets.btagRobustParTAK4CvL > 0.117),
-                        "tight": (jets.btagRobustParTAK4CvB > 0.095)
-                        & (jets.btagRobustParTAK4CvL > 0.358),
-                    },
-                },
-                # https://indico.cern.ch/event/1304360/contributions/5518915/attachments/2692528/4678901/BTagPerf_230808_Summer22WPs.pdf
-                "b": {
-                    "deepjet": {
-                        "loose": jets.btagDeepFlavB > 0.0583,
-                        "medium": jets.btagDeepFlavB > 0.3086,
-                        "tight": jets.btagDeepFlavB > 0.7183,
-                    },
-                    "pnet": {
-                        "loose": jets.btagDeepFlavB > 0.047,
-                        "medium": jets.btagDeepFlavB > 0.245,
-                        "tight": jets.btagDeepFlavB > 0.6734,
-                    },
-                    "part": {
-                        "loose": jets.btagDeepFlavB > 0.0849,
-                        "medium": jets.btagDeepFlavB > 0.4319,
-                        "tight": jets.btagDeepFlavB > 0.8482,
-                    },
-                },
-            },
-            "2022": {},
-            "2023": {}
+        phasespace_cuts, jets, indices = self.jet_bins(events)
+
+        # only evaluate the masks of the requested working points
+        working_points_mask = WorkingPointMasks.from_events(events, self.year)
+        for (i, flavor), (j, tagger), (k, wp) in itertools.product(
+            enumerate(self.flavors), enumerate(self.taggers), enumerate(self.wps)
+        ):
+            pass_wp = ak.to_numpy(
+                ak.flatten(working_points_mask[flavor, tagger, wp])
+            )[phasespace_cuts]
+            fill_indices(
+                eff_histogram,
+                dataset=0,
+                tagger=j,
+                tag_flavor=i,
+                wp=k,
+                pass_wp=pass_wp.view(np.int8),
+                **indices,
+            )
+
+        return {dataset: {"histograms": {"eff": eff_histogram}}}
+
+    def process_discriminant(self, events):
+        dataset = events.metadata["dataset"]
+
+        edges = {
+            (flavor, tagger): self.discriminant_edges(flavor, tagger)
+            for flavor, tagger in itertools.product(self.flavors, self.taggers)
         }
-        pass_wp = working_points_mask[self.year][self.flavor][self.tagger][self.wp]
-
-        eff_histogram.fill(
-            dataset=dataset,
-            pt=ak.flatten(jets.pt),
-            eta=ak.flatten(jets.eta),
-            flavor=ak.values_astype(ak.flatten(jets.hadronFlavour), "int32"),
-            pass_wp=ak.flatten(pass_wp),
+        discriminants = {d for tagger_edges in edges.values() for d in tagger_edges}
+        phasespace_cuts, jets, indices = self.jet_bins(
+            events, fields=sorted(discriminants)
         )
 
-        return {"histograms": eff_histogram}
+        histograms = {}
+        for (flavor, tagger), tagger_edges in edges.items():
+            discriminant_axes = [
+                hist.axis.Variable(discriminant_edges, name=discriminant)
+                for discriminant, discriminant_edges in tagger_edges.items()
+            ]
+            discriminant_histogram = hist.Hist(
+                hist.axis.StrCategory([dataset], growth=True, name="dataset"),
+                self.pt_axis,
+                self.eta_axis,
+                self.flavor_axis,
+                *discriminant_axes,
+            )
+            fill_indices(
+                discriminant_histogram,
+                dataset=0,
+                **indices,
+                **{
+                    axis.name: axis.index(jets[axis.name][phasespace_cuts])
+                    for axis in discriminant_axes
+                },
+            )
+            histograms[f"{tagger}_{flavor}"] = discriminant_histogram
+
+        return {dataset: {"histograms": histograms}}
 
     def postprocess(self, accumulator):
-        pass
\ No newline at end of file
+        pass
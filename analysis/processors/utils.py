@@ -1,6 +1,54 @@
+import hist
 import numpy as np
 import awkward as ak
 
 def normalize(array: ak.Array):
     flat_array = ak.flatten(array)
-    return ak.to_numpy(ak.fill_none(flat_array, np.nan))
\ No newline at end of file
+    return ak.to_numpy(ak.fill_none(flat_array, np.nan))
+
+
+def flat_fields(array: ak.Array, fields: list) -> dict:
+    """
+    get flat numpy arrays of several fields of a jagged collection. The
+    collection is flattened once and the field arrays are views of its
+    content buffers
+    """
+    flat_array = ak.flatten(array[fields])
+    return {field: ak.to_numpy(flat_array[field]) for field in fields}
+
+
+def category_lut(axis: hist.axis.IntCategory) -> np.ndarray:
+    """
+    lookup table from integer category values to bin indices. Values that are
+    not categories of the axis are mapped to the overflow bin index (axis size)
+    """
+    categories = np.asarray(list(axis), dtype=np.int64)
+    lut = np.full(categories.max() + 2, axis.size, dtype=np.int64)
+    lut[categories] = np.arange(axis.size)
+    return lut
+
+
+def fill_indices(histogram: hist.Hist, weight=None, **indices) -> None:
+    """
+    fill a histogram from precomputed bin indices (as given by axis.index(),
+    -1 for underflow and axis size for overflow) instead of values. Scalars
+    are broadcasted. Entries falling in non-existent flow bins are dropped
+    """
+    shape = histogram.view(flow=True).shape
+    # build the flat (row-major) bin index axis by axis, scalar indices
+    # don't allocate arrays
+    flat_index = np.int64(0)
+    valid = True
+    for axis, size in zip(histogram.axes, shape):
+        index = np.asarray(indices[axis.name])
+        offset = 1 if axis.traits.underflow else 0
+        valid = valid & (index >= -offset) & (index < size - offset)
+        flat_index = np.add(flat_index * size, index, dtype=np.int64) + offset
+    if np.ndim(valid) and not np.all(valid):
+        flat_index = flat_index[valid]
+        if weight is not None:
+            weight = np.asarray(weight)[valid]
+    counts = np.bincount(
+        np.ravel(flat_index), weights=weight, minlength=int(np.prod(shape))
+    )
+    histogram.view(flow=True)[...] += counts.reshape(shape)
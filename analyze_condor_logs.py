@@ -0,0 +1,51 @@
+import json
+import argparse
+from pathlib import Path
+from analysis.filesets.index import FileIndex
+from condor.user_logs import analyze_logs
+
+
+def main(args):
+    index = FileIndex(f"{Path.cwd()}/analysis/filesets/index_{args.year}.json")
+    report = analyze_logs(args.logs_path, args.year, index.index)
+    if not report:
+        raise FileNotFoundError(f"No job logs found in {args.logs_path}/*/{args.year}")
+    print(f"{'sample':<40} {'jobs':>5} {'s/file':>9} {'memory MB':>10} {'cpus':>5} {'evicted':>8}")
+    for sample, stats in report.items():
+        time_per_file = f"{stats['time_per_file']:.1f}" if stats["time_per_file"] else "-"
+        cpu_usage = f"{stats['cpu_usage']:.1f}" if stats["cpu_usage"] else "-"
+        print(
+            f"{sample:<40} {stats['jobs']:>5} {time_per_file:>9} {stats['memory']:>10} "
+            f"{cpu_usage:>5} {stats['eviction_rate']:>8.1%}"
+        )
+    output = args.output or f"{Path.cwd()}/condor/log_report_{args.year}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"report saved to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--logs_path",
+        dest="logs_path",
+        type=str,
+        default=str(Path.cwd() / "condor" / "logs"),
+        help="condor logs directory with the <jobpath>/<jobname>.<cluster>.<proc>.log user logs, inside the condor directory with the submitted jobs (default condor/logs)",
+    )
+    parser.add_argument(
+        "--year",
+        dest="year",
+        type=str,
+        default="2022EE",
+        help="year of the data {2022EE, 2022, 2023}",
+    )
+    parser.add_argument(
+        "--output",
+        dest="output",
+        type=str,
+        default="",
+        help="report JSON, read by submit_condor.py to set the job requests (default condor/log_report_<year>.json)",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,144 @@
+"""
+Benchmark of the TaggingEfficiencyProcessor histogram filling
+
+Compares the memory allocated per chunk by the previous filling (one
+ak.flatten per jet field, values_astype of hadronFlavour and hist.fill with
+an IntCategory search) with the current single-flatten, index-based filling.
+Synthetic PFNano-like jets are used so no input files are needed.
+
+Memory is measured with tracemalloc, which traces Python and numpy buffers
+but not the buffers allocated by awkward's C++ kernels (flatten, masking),
+so the 'before' numbers are a lower bound.
+
+usage: python -m benchmarks.tag_eff_fill --nevents 100000 --nchunks 5
+"""
+import time
+import hist
+import argparse
+import itertools
+import tracemalloc
+import numpy as np
+import awkward as ak
+from analysis.configs.working_points import WorkingPointMasks
+from analysis.processors.tag_eff import TaggingEfficiencyProcessor
+
+
+class Events:
+    """minimal stand-in of a NanoEvents chunk"""
+
+    def __init__(self, jets: ak.Array, dataset: str) -> None:
+        self.Jet = jets
+        self.metadata = {"dataset": dataset}
+
+
+def make_events(nevents: int, seed: int = 0) -> Events:
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(5, nevents)
+    njets = counts.sum()
+    fields = {
+        "pt": rng.exponential(60, njets).astype(np.float32) + 15,
+        "eta": rng.uniform(-3, 3, njets).astype(np.float32),
+        "hadronFlavour": rng.choice(np.array([0, 4, 5], dtype=np.int32), njets),
+    }
+    for discriminant in [
+        "btagDeepFlavCvB",
+        "btagDeepFlavCvL",
+        "btagDeepFlavB",
+        "btagPNetCvB",
+        "btagPNetCvL",
+        "btagPNetB",
+        "btagRobustParTAK4CvB",
+        "btagRobustParTAK4CvL",
+        "btagRobustParTAK4B",
+    ]:
+        fields[discriminant] = rng.uniform(0, 1, njets).astype(np.float32)
+    return Events(ak.unflatten(ak.zip(fields), counts), dataset="benchmark")
+
+
+def previous_process(tag_eff: TaggingEfficiencyProcessor, events: Events) -> dict:
+    """filling as done before the single-pass implementation"""
+    dataset = events.metadata["dataset"]
+    eff_histogram = hist.Hist(
+        hist.axis.StrCategory([], growth=True, name="dataset"),
+        hist.axis.StrCategory(tag_eff.taggers, name="tagger"),
+        hist.axis.StrCategory(tag_eff.flavors, name="tag_flavor"),
+        hist.axis.StrCategory(tag_eff.wps, name="wp"),
+        hist.axis.Variable([20, 30, 50, 70, 100, 140, 200, 300, 600, 1000], name="pt"),
+        hist.axis.Regular(10, -2.5, 2.5, name="eta"),
+        hist.axis.IntCategory([0, 4, 5], name="flavor"),
+        hist.axis.IntCategory([0, 1], name="pass_wp"),
+    )
+    phasespace_cuts = (abs(events.Jet.eta) < 2.5) & (events.Jet.pt > 20.0)
+    jets = events.Jet[phasespace_cuts]
+    jets_pt = ak.flatten(jets.pt)
+    jets_eta = ak.flatten(jets.eta)
+    jets_flavor = ak.values_astype(ak.flatten(jets.hadronFlavour), "int32")
+    working_points_mask = WorkingPointMasks.from_events(events, tag_eff.year)
+    for flavor, tagger, wp in itertools.product(
+        tag_eff.flavors, tag_eff.taggers, tag_eff.wps
+    ):
+        pass_wp = working_points_mask[flavor, tagger, wp][phasespace_cuts]
+        eff_histogram.fill(
+            dataset=dataset,
+            tagger=tagger,
+            tag_flavor=flavor,
+            wp=wp,
+            pt=jets_pt,
+            eta=jets_eta,
+            flavor=jets_flavor,
+            pass_wp=ak.flatten(pass_wp),
+        )
+    return {dataset: {"histograms": {"eff": eff_histogram}}}
+
+
+def measure(function, tag_eff, chunks) -> dict:
+    """mean allocated memory (tracemalloc peak), number of allocations and time per chunk"""
+    peaks, allocations, times = [], [], []
+    for events in chunks:
+        # warm up the working points table so both methods are compared on the filling
+        WorkingPointMasks.from_events(events, tag_eff.year)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        t0 = time.perf_counter()
+        function(tag_eff, events)
+        times.append(time.perf_counter() - t0)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+        allocations.append(
+            sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+        )
+    return {
+        "peak_mb": np.mean(peaks) / 1e6,
+        "allocations": np.mean(allocations),
+        "time_ms": 1e3 * np.mean(times),
+    }
+
+
+def main(args):
+    tag_eff = TaggingEfficiencyProcessor(
+        tagger=args.tagger, flavor=args.flavor, wp=args.wp, year="2022EE"
+    )
+    chunks = [make_events(args.nevents, seed) for seed in range(args.nchunks)]
+    results = {
+        "before": measure(previous_process, tag_eff, chunks),
+        "after": measure(TaggingEfficiencyProcessor.process, tag_eff, chunks),
+    }
+    print(f"{args.nevents} events/chunk, tagger={args.tagger} flavor={args.flavor} wp={args.wp}")
+    print(f"{'':8}{'peak alloc [MB]':>18}{'allocations':>14}{'time [ms]':>12}")
+    for name, result in results.items():
+        print(
+            f"{name:8}{result['peak_mb']:>18.2f}{result['allocations']:>14.0f}{result['time_ms']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nevents", dest="nevents", type=int, default=100000, help="events per chunk")
+    parser.add_argument("--nchunks", dest="nchunks", type=int, default=5, help="number of chunks")
+    parser.add_argument("--tagger", dest="tagger", type=str, default="all", help="tagger {pnet, part, deepjet, all}")
+    parser.add_argument("--flavor", dest="flavor", type=str, default="all", help="Hadron flavor {c, b, all}")
+    parser.add_argument("--wp", dest="wp", type=str, default="all", help="working point {loose, medium, tight, all}")
+    args = parser.parse_args()
+    main(args)
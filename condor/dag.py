@@ -0,0 +1,184 @@
+import os
+import shlex
+from pathlib import Path
+from condor.utils import job_names
+from analysis.execution.outputs import processor_path
+from condor.local import LocalScheduler, submit_spec, next_cluster_id
+from condor.user_logs import DEFAULT_RESOURCES
+
+
+def write_dag(jobs: list, name: str, retries: int, x509_path: str) -> str:
+    """
+    write a DAGMan workflow for a campaign in condor/dags/<name>/: a processing
+    node per job, a merge node per sample (child of the nodes processing its
+    partitions) and a final normalization node (child of all merge nodes).
+    The merge and normalization nodes only read the output directories of
+    the campaign jobs. All nodes are retried up to `retries` times
+
+    Parameters:
+        jobs: args of each job, with the submit.py options in 'arguments'
+        name: campaign name
+        retries: number of retries of a failed node
+        x509_path: proxy path exported by the node executable
+
+    Returns:
+        path of the .dag file
+    """
+    main_dir = Path.cwd()
+    condor_dir = Path(main_dir / "condor")
+    dag_dir = Path(condor_dir / "dags" / name)
+    dag_dir.mkdir(parents=True, exist_ok=True)
+    year = jobs[0]["year"]
+    processor = jobs[0]["processor"]
+
+    # node submit file and executable, shared by all the nodes
+    node_sub = f"{dag_dir}/node.sub"
+    with open(f"{condor_dir}/dag_node.sub") as template, open(node_sub, "w") as f:
+        for line in template:
+            line = line.replace("DIRECTORY", str(condor_dir))
+            line = line.replace("JOBNAME", name)
+            f.write(line)
+    node_sh = f"{dag_dir}/{name}.sh"
+    with open(f"{condor_dir}/submit.sh") as template, open(node_sh, "w") as f:
+        for line in template:
+            line = line.replace("MAINDIRECTORY", str(main_dir))
+            line = line.replace("COMMAND", 'python3 "$@"')
+            line = line.replace("X509PATH", x509_path)
+            f.write(line)
+    os.chmod(node_sh, 0o755)
+
+    lines = []
+
+    def add_node(
+        node: str, jobpath: str, jobname: str, arguments: str, resources: dict = DEFAULT_RESOURCES
+    ) -> None:
+        Path(condor_dir / "logs" / jobpath).mkdir(parents=True, exist_ok=True)
+        lines.append(f"JOB {node} {node_sub}")
+        lines.append(
+            f'VARS {node} jobpath="{jobpath}" jobname="{jobname}" '
+            f'flavour="{resources["job_flavour"]}" memory="{resources["request_memory"]}" '
+            f'cpus="{resources["request_cpus"]}" arguments="{arguments}"'
+        )
+        lines.append(f"RETRY {node} {retries}")
+
+    # output directories of the campaign, relative to the outputs directory
+    output_dirs = ",".join(
+        sorted(
+            {
+                processor_path(job_args, name)
+                for job_args in jobs
+                for name in job_args["processor"].split(",")
+            }
+        )
+    )
+    sample_nodes = {}
+    for i, job_args in enumerate(jobs):
+        jobpath, jobname = job_names(job_args)
+        add_node(
+            f"process_{i}", jobpath, jobname, f"submit.py {job_args['arguments'].strip()}", job_args
+        )
+        for sample in job_args["sample"].split(","):
+            sample_nodes.setdefault(sample, []).append(f"process_{i}")
+    for sample, nodes in sample_nodes.items():
+        add_node(
+            f"merge_{sample}",
+            f"merge/{year}",
+            f"merge_{sample}",
+            f"merge_outputs.py --year {year} --processor {processor} --sample {sample} "
+            f"--output_dirs {output_dirs}",
+        )
+        lines.append(f"PARENT {' '.join(nodes)} CHILD merge_{sample}")
+    add_node(
+        "normalize",
+        f"merge/{year}",
+        "normalize",
+        f"merge_outputs.py --year {year} --processor {processor} --normalize --no_merge "
+        f"--output_dirs {output_dirs}",
+    )
+    lines.append(
+        f"PARENT {' '.join(f'merge_{sample}' for sample in sample_nodes)} CHILD normalize"
+    )
+
+    dag_file = f"{dag_dir}/{name}.dag"
+    with open(dag_file, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return dag_file
+
+
+def read_dag(dag_file: str) -> dict:
+    """{node: {"submit", "vars", "retry", "parents"}} from the JOB, VARS, RETRY and PARENT lines of a DAG"""
+    nodes = {}
+    for line in Path(dag_file).read_text().splitlines():
+        tokens = shlex.split(line)
+        if not tokens or tokens[0].startswith("#"):
+            continue
+        if tokens[0] == "JOB":
+            nodes[tokens[1]] = {"submit": tokens[2], "vars": {}, "retry": 0, "parents": set()}
+        elif tokens[0] == "VARS":
+            nodes[tokens[1]]["vars"].update(token.split("=", 1) for token in tokens[2:])
+        elif tokens[0] == "RETRY":
+            nodes[tokens[1]]["retry"] = int(tokens[2])
+        elif tokens[0] == "PARENT":
+            child = tokens.index("CHILD")
+            for node in tokens[child + 1 :]:
+                nodes[node]["parents"].update(tokens[1:child])
+    return nodes
+
+
+def run_dag_local(dag_file: str, max_jobs: int) -> dict:
+    """
+    run a DAG on the local machine with a LocalScheduler: nodes start once
+    all their parents succeeded, failed nodes are retried as with DAGMan and
+    the descendants of nodes that keep failing are skipped
+
+    Returns:
+        {node: status} with status in {done, failed, skipped}
+    """
+    nodes = read_dag(dag_file)
+    logs_dir = f"{Path.cwd()}/condor/logs"
+    status = {node: "pending" for node in nodes}
+    attempts = {node: 0 for node in nodes}
+    scheduler = LocalScheduler(max_jobs)
+    while True:
+        skipped = True
+        while skipped:
+            skipped = False
+            for node, info in nodes.items():
+                if status[node] == "pending" and any(
+                    status[parent] in ["failed", "skipped"] for parent in info["parents"]
+                ):
+                    status[node] = "skipped"
+                    skipped = True
+        ready = [
+            node
+            for node, info in nodes.items()
+            if status[node] == "pending"
+            and all(status[parent] == "done" for parent in info["parents"])
+        ]
+        for node in ready:
+            if scheduler.full():
+                break
+            cluster = next_cluster_id(logs_dir)
+            macros = {**nodes[node]["vars"], "ClusterId": cluster, "ProcId": 0}
+            spec = {
+                "name": node,
+                "cluster": cluster,
+                "proc": 0,
+                **submit_spec(nodes[node]["submit"], macros),
+            }
+            scheduler.start(spec)
+            status[node] = "running"
+            attempts[node] += 1
+        if not scheduler.running:
+            break
+        spec, returncode, usage = scheduler.wait()
+        node = spec["name"]
+        if returncode == 0:
+            status[node] = "done"
+        elif attempts[node] <= nodes[node]["retry"]:
+            print(f"{node} failed (return code {returncode}), retrying")
+            status[node] = "pending"
+        else:
+            print(f"{node} failed (return code {returncode})")
+            status[node] = "failed"
+    return status
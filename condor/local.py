@@ -0,0 +1,230 @@
+import os
+import re
+import shlex
+import time
+import subprocess
+from pathlib import Path
+
+
+def submit_spec(submit_file: str, macros: dict) -> dict:
+    """commands of a single-job condor submit file with its $(macros) expanded"""
+    spec = {}
+    for line in Path(submit_file).read_text().splitlines():
+        if "=" not in line or line.strip().startswith(("#", "queue")):
+            continue
+        key, value = line.split("=", 1)
+        spec[key.strip()] = re.sub(
+            r"\$\((\w+)\)",
+            lambda m: str(macros.get(m.group(1), m.group(0))),
+            value.strip(),
+        )
+    return spec
+
+
+def queue_specs(submit_file: str, cluster: int) -> list:
+    """
+    job specs of a condor submit file, one per job of its queue statement
+    (queue N or queue <vars> from <itemdata file>), named after their log file
+    """
+    text = Path(submit_file).read_text()
+    statement = [line for line in text.splitlines() if line.strip().startswith("queue")][-1]
+    match = re.match(r"queue\s+(.*?)\s+from\s+(.*)", statement.strip())
+    if match is None:
+        variables = []
+        count = statement.split()[1] if len(statement.split()) > 1 else "1"
+        items = [[] for _ in range(int(count))]
+    else:
+        variables = [v for v in re.split(r"[,\s]+", match.group(1)) if v]
+        items = [
+            # the last variable takes the rest of the line
+            [field.strip() for field in line.split(",", len(variables) - 1)]
+            for line in Path(match.group(2).strip()).read_text().splitlines()
+            if line.strip() and not line.strip().startswith("#")
+        ]
+    specs = []
+    for proc, item in enumerate(items):
+        macros = {"ClusterId": cluster, "ProcId": proc, **dict(zip(variables, item))}
+        spec = submit_spec(submit_file, macros)
+        specs.append({"name": Path(spec["log"]).stem, "cluster": cluster, "proc": proc, **spec})
+    return specs
+
+
+def next_cluster_id(logs_dir: str) -> int:
+    """local equivalent of a condor cluster id, increased at every call"""
+    counter = Path(f"{logs_dir}/.local_cluster_id")
+    counter.parent.mkdir(parents=True, exist_ok=True)
+    cluster = int(counter.read_text()) + 1 if counter.exists() else 1
+    counter.write_text(str(cluster))
+    return cluster
+
+
+def _cpu_time(seconds: float) -> str:
+    """condor user log usage format: days hh:mm:ss"""
+    seconds = int(round(seconds))
+    return f"{seconds // 86400} {time.strftime('%H:%M:%S', time.gmtime(seconds % 86400))}"
+
+
+def write_log_event(spec: dict, code: str, text: str) -> None:
+    """append an event to the job condor user log (spec 'log')"""
+    if not spec.get("log"):
+        return
+    header = (
+        f"{code} ({spec.get('cluster', 0):03d}.{spec.get('proc', 0):03d}.000) "
+        f"{time.strftime('%Y-%m-%d %H:%M:%S')} {text}"
+    )
+    with open(spec["log"], "a") as f:
+        f.write(f"{header}\n...\n")
+
+
+def process_tree_memory(pids: list) -> dict:
+    """
+    resident memory in MB of the process trees rooted at pids (a job and all
+    its subprocesses, e.g. futures workers), from /proc. Empty if /proc is
+    not available
+    """
+    parents, rss = {}, {}
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # fields after the command name: state, ppid, ..., rss (in pages)
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        pid = int(stat.parent.name)
+        parents[pid] = int(fields[1])
+        rss[pid] = int(fields[21]) * page_size
+    children = {}
+    for pid, parent in parents.items():
+        children.setdefault(parent, []).append(pid)
+    memory = {}
+    for root in pids:
+        if root not in rss:
+            continue
+        tree, total = [root], 0
+        while tree:
+            pid = tree.pop()
+            total += rss.get(pid, 0)
+            tree.extend(children.get(pid, []))
+        memory[root] = total / 1024**2
+    return memory
+
+
+class LocalScheduler:
+    """
+    Run condor job specs ({"name", "executable", "arguments", "output",
+    "error", "log"}) as local processes, at most max_jobs at a time. The job
+    stdout and stderr go to the spec output and error files, and the submit,
+    execute and termination events (with the CPU time and peak memory of the
+    job) to its user log, as with condor
+
+    Attributes:
+        max_jobs: maximum number of jobs running at the same time
+        poll_interval: seconds between checks of the running jobs, their
+            memory is sampled at each check
+    """
+
+    def __init__(self, max_jobs: int, poll_interval: float = 0.5) -> None:
+        self.max_jobs = max(max_jobs, 1)
+        self.poll_interval = poll_interval
+        self.running = {}
+        self.memory = {}
+
+    def full(self) -> bool:
+        return len(self.running) >= self.max_jobs
+
+    def start(self, spec: dict) -> None:
+        for path in [spec["output"], spec["error"], spec.get("log", spec["output"])]:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(spec["output"], "w") as stdout, open(spec["error"], "w") as stderr:
+            process = subprocess.Popen(
+                [spec["executable"], *shlex.split(spec.get("arguments", ""))],
+                stdout=stdout,
+                stderr=stderr,
+            )
+        self.running[process.pid] = (spec, process)
+        self.memory[process.pid] = 0.0
+        write_log_event(spec, "000", "Job submitted from host: <127.0.0.1>")
+        write_log_event(spec, "001", "Job executing on host: <127.0.0.1>")
+
+    def wait(self) -> tuple:
+        """
+        wait for any running job to finish. Only the jobs started by the
+        scheduler are reaped
+
+        Returns:
+            spec, return code and usage {"cpu_time": seconds, "memory": MB}.
+            memory is the peak total RSS of the job process tree sampled
+            every poll_interval, or the peak RSS of its largest single
+            process (ru_maxrss) if that is higher or /proc is not available
+        """
+        while True:
+            for pid, memory in process_tree_memory(list(self.running)).items():
+                self.memory[pid] = max(self.memory[pid], memory)
+            for pid in list(self.running):
+                finished, status, rusage = os.wait4(pid, os.WNOHANG)
+                if finished:
+                    break
+            else:
+                time.sleep(self.poll_interval)
+                continue
+            break
+        spec, process = self.running.pop(pid)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        usage = {
+            "cpu_time": rusage.ru_utime + rusage.ru_stime,
+            # ru_maxrss is in KB on linux
+            "memory": max(self.memory.pop(pid), rusage.ru_maxrss / 1024),
+        }
+        if process.returncode < 0:
+            termination = f"(0) Abnormal termination (signal {-process.returncode})"
+        else:
+            termination = f"(1) Normal termination (return value {process.returncode})"
+        cpu_usage = f"Usr {_cpu_time(rusage.ru_utime)}, Sys {_cpu_time(rusage.ru_stime)}"
+        write_log_event(
+            spec,
+            "005",
+            "Job terminated.\n"
+            f"\t{termination}\n"
+            f"\t\t{cpu_usage}  -  Run Remote Usage\n"
+            f"\t\t{cpu_usage}  -  Total Remote Usage\n"
+            "\tPartitionable Resources :    Usage  Request Allocated\n"
+            f"\t   Cpus                 :          {spec.get('request_cpus', 1):>8} {spec.get('request_cpus', 1):>9}\n"
+            f"\t   Memory (MB)          : {usage['memory']:>8.0f} {spec.get('request_memory', '-'):>8} {spec.get('request_memory', '-'):>9}",
+        )
+        return spec, process.returncode, usage
+
+    def run(self, specs: list) -> dict:
+        """run independent jobs. Returns {job name: {"returncode", "cpu_time", "memory"}}"""
+        pending = list(specs)
+        accounting = {}
+        while pending or self.running:
+            while pending and not self.full():
+                self.start(pending.pop(0))
+            spec, returncode, usage = self.wait()
+            accounting[spec["name"]] = {"returncode": returncode, **usage}
+        return accounting
+
+
+def run_local(submit_files: list, max_jobs: int) -> dict:
+    """
+    run the jobs of condor submit files on this machine, at most max_jobs at a
+    time. Each submit file gets its own local cluster id, logs follow the
+    condor/logs layout of the submit files
+
+    Returns:
+        {job name: {"returncode", "cpu_time", "memory"}}
+    """
+    logs_dir = f"{Path.cwd()}/condor/logs"
+    specs = [
+        spec
+        for submit_file in submit_files
+        for spec in queue_specs(submit_file, next_cluster_id(logs_dir))
+    ]
+    print(f"running {len(specs)} jobs locally, {max_jobs} at a time")
+    accounting = LocalScheduler(max_jobs).run(specs)
+    for name, job in accounting.items():
+        print(
+            f"{name}: return code {job['returncode']}, "
+            f"cpu time {job['cpu_time']:.1f} s, peak memory {job['memory']:.0f} MB"
+        )
+    return accounting
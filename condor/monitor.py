@@ -0,0 +1,155 @@
+import json
+import subprocess
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from condor.utils import submit_condor, job_names
+from condor.user_logs import parse_user_log
+
+
+def write_campaign(jobs: list, name: str, submitted: str) -> str:
+    """
+    save the jobs of a condor submission to condor/campaigns/<name>.json,
+    so that monitor_campaign can follow and duplicate them. Jobs submitted
+    before submitted ('%Y-%m-%d %H:%M:%S') belong to previous campaigns
+
+    Returns:
+        campaign file path
+    """
+    campaign_dir = Path(Path.cwd() / "condor" / "campaigns")
+    campaign_dir.mkdir(parents=True, exist_ok=True)
+    campaign = {
+        "name": name,
+        "submitted": submitted,
+        "jobs": [
+            {**job_args, **dict(zip(["jobpath", "jobname"], job_names(job_args)))}
+            for job_args in jobs
+        ],
+        "duplicates": {},
+        "removed": [],
+    }
+    campaign_file = f"{campaign_dir}/{name}.json"
+    save_campaign(campaign, campaign_file)
+    return campaign_file
+
+
+def save_campaign(campaign: dict, campaign_file: str) -> None:
+    with open(campaign_file, "w") as f:
+        json.dump(campaign, f, indent=4)
+
+
+def job_nfiles(job_args: dict) -> int:
+    """number of files (or file ranges) processed by a job"""
+    nfiles = 0
+    for fileset in job_args["fileset"].split():
+        with open(fileset, "r") as f:
+            nfiles += sum(len(items) for items in json.load(f).values())
+    return nfiles
+
+
+def job_attempts(job_args: dict, since: datetime, logs_path: str) -> dict:
+    """
+    condor jobs (original and duplicates) of a campaign job submitted after
+    since, from their user logs: {"cluster.proc": parse_user_log job}
+    """
+    attempts = {}
+    for log_file in Path(f"{logs_path}/{job_args['jobpath']}").glob(f"{job_args['jobname']}.*.log"):
+        for (cluster, proc), job in parse_user_log(log_file).items():
+            if job["submitted"] is not None and job["submitted"] >= since:
+                attempts[f"{cluster}.{proc}"] = job
+    return attempts
+
+
+def job_status(attempts: dict) -> str:
+    """done if any attempt succeeded, failed if all of them ended, running or idle otherwise"""
+    if any(job["returncode"] == 0 for job in attempts.values()):
+        return "done"
+    active = [
+        job for job in attempts.values() if job["returncode"] is None and not job["removed"]
+    ]
+    if attempts and not active:
+        return "failed"
+    if any(job["start"] is not None for job in active):
+        return "running"
+    return "idle"
+
+
+def monitor_step(
+    campaign: dict,
+    campaign_file: str,
+    factor: float,
+    max_duplicates: int,
+    min_finished: int,
+    logs_path: str,
+) -> dict:
+    """
+    one pass of the campaign monitor: jobs running longer than factor times
+    their predicted duration get a duplicate (at most max_duplicates), and
+    once an attempt of a job succeeds its other attempts are removed, so the
+    first one to finish is kept (outputs are written atomically, so
+    duplicates never leave partial outputs).
+
+    The predicted duration of a job is the median time per file of the
+    finished jobs of its sample in the campaign (once there are min_finished
+    of them) times its number of files, or the duration expected from the
+    condor log report at submission
+
+    Returns:
+        {status: [jobnames]}
+    """
+    since = datetime.strptime(campaign["submitted"], "%Y-%m-%d %H:%M:%S")
+    now = datetime.now()
+    attempts, statuses = {}, {}
+    time_per_file = {}
+    for job_args in campaign["jobs"]:
+        jobname = job_args["jobname"]
+        attempts[jobname] = job_attempts(job_args, since, logs_path)
+        statuses[jobname] = job_status(attempts[jobname])
+        for job in attempts[jobname].values():
+            if job["returncode"] == 0 and job["wall_time"]:
+                time_per_file.setdefault(job_args["sample"], []).append(
+                    job["wall_time"] / max(job_nfiles(job_args), 1)
+                )
+
+    for job_args in campaign["jobs"]:
+        jobname = job_args["jobname"]
+        active = {
+            job_id: job
+            for job_id, job in attempts[jobname].items()
+            if job["returncode"] is None
+            and not job["removed"]
+            and job_id not in campaign["removed"]
+        }
+        if statuses[jobname] == "done":
+            # keep the first attempt to finish
+            for job_id in active:
+                print(f"{jobname}: finished, removing {job_id}")
+                subprocess.run(["condor_rm", job_id])
+                campaign["removed"].append(job_id)
+            continue
+        if statuses[jobname] != "running":
+            continue
+        sample_times = time_per_file.get(job_args["sample"], [])
+        if len(sample_times) >= min_finished:
+            predicted = float(np.median(sample_times)) * job_nfiles(job_args)
+        else:
+            predicted = job_args.get("expected_duration")
+        if not predicted:
+            continue
+        elapsed = max(
+            (now - job["start"]).total_seconds() for job in active.values() if job["start"]
+        )
+        duplicates = campaign["duplicates"].get(jobname, 0)
+        if elapsed > factor * predicted and duplicates < max_duplicates:
+            print(
+                f"{jobname}: running for {elapsed:.0f} s, predicted {predicted:.0f} s, "
+                "submitting a duplicate"
+            )
+            submit_condor(job_args)
+            campaign["duplicates"][jobname] = duplicates + 1
+
+    save_campaign(campaign, campaign_file)
+    jobs_by_status = {}
+    for jobname, status in statuses.items():
+        jobs_by_status.setdefault(status, []).append(jobname)
+    return jobs_by_status
@@ -0,0 +1,280 @@
+import re
+import json
+import shlex
+import math
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from analysis.postprocess.merge import sample_name
+
+# request of jobs without log history (condor defaults at lxplus)
+DEFAULT_RESOURCES = {"job_flavour": "longlunch", "request_memory": 2000, "request_cpus": 1}
+
+# maximum runtime in seconds of each JobFlavour
+JOB_FLAVOURS = {
+    "espresso": 20 * 60,
+    "microcentury": 60 * 60,
+    "longlunch": 2 * 60 * 60,
+    "workday": 8 * 60 * 60,
+    "tomorrow": 24 * 60 * 60,
+    "testmatch": 3 * 24 * 60 * 60,
+    "nextweek": 7 * 24 * 60 * 60,
+}
+
+EVENT = re.compile(r"^(\d{3}) \((\d+)\.(\d+)\.\d+\) (\S+ \S+) (.*)")
+
+
+def _event_time(stamp: str) -> datetime:
+    """time of an event, in the ISO or the older month/day user log format"""
+    for time_format in ["%Y-%m-%d %H:%M:%S", "%m/%d %H:%M:%S"]:
+        try:
+            return datetime.strptime(stamp, time_format)
+        except ValueError:
+            continue
+    raise ValueError(f"unknown user log time format {stamp}")
+
+
+def _usage_seconds(usage: str) -> float:
+    """seconds of a 'Usr d hh:mm:ss, Sys d hh:mm:ss' usage line"""
+    seconds = 0
+    for days, hours, minutes, secs in re.findall(r"(\d+) (\d+):(\d+):(\d+)", usage):
+        seconds += int(days) * 86400 + int(hours) * 3600 + int(minutes) * 60 + int(secs)
+    return seconds
+
+
+def parse_user_log(path: str) -> dict:
+    """
+    jobs of a condor user log
+
+    Returns:
+        {(cluster, proc): {"attempts", "evictions", "holds", "removed",
+        "returncode", "wall_time", "cpu_time", "memory", "submitted",
+        "start"}} with the wall and cpu times in seconds of the last
+        execution, the memory high-water mark in MB and the submit and last
+        execution datetimes. returncode and times are None for jobs that did
+        not terminate
+    """
+    jobs = {}
+    events = Path(path).read_text().split("\n...")
+    for event in events:
+        lines = event.strip("\n").splitlines()
+        match = EVENT.match(lines[0]) if lines else None
+        if match is None:
+            continue
+        code, cluster, proc, stamp, _ = match.groups()
+        job = jobs.setdefault(
+            (int(cluster), int(proc)),
+            {
+                "attempts": 0,
+                "evictions": 0,
+                "holds": 0,
+                "removed": False,
+                "returncode": None,
+                "wall_time": None,
+                "cpu_time": None,
+                "memory": 0,
+                "submitted": None,
+                "start": None,
+            },
+        )
+        for line in lines[1:]:
+            memory = re.match(r"\s*(\d+)\s+-\s+MemoryUsage of job", line)
+            if memory is None:
+                memory = re.match(r"\s*Memory \(MB\)\s*:\s*(\d+)", line)
+            if memory is not None:
+                job["memory"] = max(job["memory"], int(memory.group(1)))
+        if code == "000":
+            job["submitted"] = _event_time(stamp)
+        elif code == "001":
+            job["attempts"] += 1
+            job["start"] = _event_time(stamp)
+        elif code == "004":
+            job["evictions"] += 1
+        elif code == "009":
+            job["removed"] = True
+        elif code == "012":
+            job["holds"] += 1
+        elif code == "005":
+            returncode = re.search(r"return value (-?\d+)", event)
+            job["returncode"] = int(returncode.group(1)) if returncode else -1
+            if job["start"] is not None:
+                job["wall_time"] = (_event_time(stamp) - job["start"]).total_seconds()
+            # cpu time of the last execution, as wall_time (Total Remote
+            # Usage adds up the attempts before evictions)
+            usage = [line for line in lines if "Run Remote Usage" in line] or [
+                line for line in lines if "Total Remote Usage" in line
+            ]
+            if usage:
+                job["cpu_time"] = _usage_seconds(usage[0])
+    return jobs
+
+
+def job_arguments(condor_path: str) -> dict:
+    """
+    submit.py arguments of the submitted jobs {(jobpath, jobname): arguments},
+    from the single job executables (<jobpath>/<jobname>.sh), the bulk
+    itemdata tables (bulk/*.items) and the DAGs (dags/*/*.dag). The latest
+    submission of a job wins
+    """
+    sources = []
+    for path in Path(condor_path).glob("**/*.sh"):
+        if path.parent.parent.name in ["bulk", "dags"] or path.parent.name == "bulk":
+            continue
+        jobpath = str(path.parent.relative_to(condor_path))
+        for line in path.read_text().splitlines():
+            if "submit.py" in line:
+                sources.append((path, [(jobpath, path.stem, line.split("submit.py", 1)[1])]))
+    for path in Path(condor_path).glob("bulk/*.items"):
+        rows = [line.split(",", 5) for line in path.read_text().splitlines() if line.strip()]
+        sources.append((path, [(row[0], row[1], row[-1]) for row in rows]))
+    for path in Path(condor_path).glob("dags/*/*.dag"):
+        jobs = []
+        for line in path.read_text().splitlines():
+            if line.startswith("VARS") and "submit.py" in line:
+                variables = dict(token.split("=", 1) for token in shlex.split(line)[2:])
+                jobs.append((variables["jobpath"], variables["jobname"], variables["arguments"]))
+        sources.append((path, jobs))
+    arguments = {}
+    for _, jobs in sorted(sources, key=lambda source: source[0].stat().st_mtime):
+        for jobpath, jobname, job_args in jobs:
+            arguments[(jobpath, jobname)] = job_args
+    return arguments
+
+
+def job_files(arguments: str) -> dict:
+    """
+    {fileset key: files} processed by a job from the --fileset option of its
+    submit.py arguments, None if a fileset does not exist anymore
+    """
+    tokens = shlex.split(arguments)
+    if "--fileset" not in tokens:
+        return None
+    filesets = []
+    for token in tokens[tokens.index("--fileset") + 1 :]:
+        if token.startswith("--"):
+            break
+        filesets.append(token)
+    files = {}
+    for fileset in filesets:
+        if not Path(fileset).exists():
+            return None
+        with open(fileset, "r") as f:
+            for key, items in json.load(f).items():
+                files[key] = [item["file"] if isinstance(item, dict) else item for item in items]
+    return files
+
+
+def analyze_logs(logs_path: str, year: str, index: dict = None) -> dict:
+    """
+    per sample statistics of the processing jobs of a campaign from their
+    condor user logs in <logs_path>/<jobpath>/<jobname>.<cluster>.<proc>.log.
+    The files of each job are read from the filesets of its submitted
+    arguments (see job_arguments), jobs whose filesets are unknown are
+    skipped. Packed jobs count for each of their samples, in proportion to
+    their files
+
+    Parameters:
+        logs_path: condor logs directory, in the condor directory of the submission files
+        year: year of the jobs to analyze
+        index: {file: {"entries", "bytes"}} file index, used to compute the time per event
+
+    Returns:
+        {sample: {"jobs", "time_per_file", "time_per_event", "memory",
+        "eviction_rate", "cpu_usage"}}
+    """
+    index = index or {}
+    arguments = job_arguments(Path(logs_path).parent)
+    samples = defaultdict(lambda: defaultdict(list))
+    for log_file in sorted(Path(logs_path).glob(f"*/{year}/**/*.log")):
+        jobpath = str(log_file.parent.relative_to(logs_path))
+        if jobpath.startswith("merge"):
+            continue
+        jobname = log_file.name.split(".")[0]
+        if (jobpath, jobname) not in arguments:
+            continue
+        files = job_files(arguments[(jobpath, jobname)])
+        nfiles = sum(len(key_files) for key_files in (files or {}).values())
+        if not nfiles:
+            continue
+        # files of each sample of the job (packed jobs have several fileset keys)
+        sample_files = defaultdict(list)
+        for key, key_files in files.items():
+            sample_files[sample_name(key, year)] += key_files
+        for job_id, job in parse_user_log(log_file).items():
+            for name, paths in sample_files.items():
+                sample = samples[name]
+                sample["jobs"].append(job_id)
+                sample["attempts"].append(job["attempts"])
+                sample["evictions"].append(job["evictions"] + job["holds"])
+                sample["memory"].append(job["memory"])
+                if job["returncode"] != 0 or not job["wall_time"]:
+                    continue
+                # the time per file of the job, weighted by its files of the sample
+                sample["time_per_file"].append(job["wall_time"] / nfiles)
+                sample["files"].append(len(paths))
+                sample["cpu_usage"].append((job["cpu_time"] or 0) / job["wall_time"])
+                if all(path in index for path in paths):
+                    entries = sum(index[path]["entries"] for path in paths)
+                    if entries and job["cpu_time"]:
+                        fraction = len(paths) / nfiles
+                        sample["time_per_event"].append(job["cpu_time"] * fraction / entries)
+
+    report = {}
+    for sample, stats in sorted(samples.items()):
+        report[sample] = {
+            "jobs": len(set(stats["jobs"])),
+            "time_per_file": (
+                float(np.average(stats["time_per_file"], weights=stats["files"]))
+                if stats["time_per_file"]
+                else None
+            ),
+            "time_per_event": float(np.mean(stats["time_per_event"])) if stats["time_per_event"] else None,
+            "memory": max(stats["memory"]),
+            "eviction_rate": sum(stats["evictions"]) / max(sum(stats["attempts"]), 1),
+            "cpu_usage": float(np.max(stats["cpu_usage"])) if stats["cpu_usage"] else None,
+        }
+    return report
+
+
+def job_flavour(duration: float, evicted: bool = False) -> str:
+    """
+    shortest JobFlavour with a maximum runtime of at least 1.5 times the
+    duration, one longer if the sample jobs are often evicted
+    """
+    flavours = list(JOB_FLAVOURS)
+    for i, flavour in enumerate(flavours):
+        if JOB_FLAVOURS[flavour] >= 1.5 * duration:
+            return flavours[min(i + evicted, len(flavours) - 1)]
+    return flavours[-1]
+
+
+def job_resources(job_args: dict, report: dict) -> dict:
+    """
+    request_memory, request_cpus and JobFlavour of a job from the log
+    report of the samples of its filesets. Jobs of samples without
+    history get DEFAULT_RESOURCES. 'expected_duration' is the job duration
+    in seconds expected from the report, None if unknown
+    """
+    duration, memory, cpus, evicted, known = 0.0, 0, 0, False, True
+    for fileset in job_args["fileset"].split():
+        with open(fileset, "r") as f:
+            for key, items in json.load(f).items():
+                stats = report.get(sample_name(key, job_args["year"]))
+                if not stats or stats["time_per_file"] is None:
+                    known = False
+                    continue
+                duration += stats["time_per_file"] * len(items)
+                memory = max(memory, stats["memory"])
+                cpus = max(cpus, stats["cpu_usage"] or 0)
+                evicted |= stats["eviction_rate"] > 0.1
+    resources = dict(DEFAULT_RESOURCES)
+    if memory:
+        # 20% margin, rounded up to 100 MB
+        resources["request_memory"] = max(int(math.ceil(memory * 1.2 / 100) * 100), 500)
+    if cpus:
+        resources["request_cpus"] = max(int(round(cpus)), 1)
+    resources["expected_duration"] = duration if known and duration else None
+    if resources["expected_duration"]:
+        resources["job_flavour"] = job_flavour(duration, evicted)
+    return resources
@@ -1,6 +1,7 @@
 import os
 import subprocess
 from pathlib import Path
+from analysis.execution.outputs import processor_path
 
 
 def move_X509() -> str:
@@ -24,24 +25,45 @@ def move_X509() -> str:
     return x509_path
 
 
-def submit_condor(args: dict) -> None:
-    """build condor and executable files. Submit condor job"""
+def job_names(args: dict) -> tuple:
+    """(jobpath, jobname) of a job: condor files and logs go to <jobpath>/<jobname>.*"""
+    processors = args["processor"].split(",")
+    if len(processors) == 1:
+        jobpath = processor_path(args, processors[0])
+    else:
+        jobpath = f"{'+'.join(processors)}/{args['year']}"
+    # packed jobs run several filesets
+    stems = [Path(fileset).stem for fileset in args["fileset"].split()]
+    if len(stems) > 4:
+        stems = [stems[0], f"{len(stems) - 1}more"]
+    jobname = f'{"+".join(processors)}_{"+".join(stems)}'
+    return jobpath, jobname
+
+
+def job_proxy(backend: str) -> str:
+    """proxy path exported by the job executable. Local jobs use the proxy of the current environment"""
+    if backend == "local":
+        return os.environ.get("X509_USER_PROXY", "")
+    return move_X509()
+
+
+def submit_condor(args: dict, backend: str = "condor") -> str:
+    """
+    build condor and executable files. Submit condor job, with backend 'local'
+    the files are only built (to be run by condor.local.run_local)
+
+    Returns:
+        condor submit file path
+    """
     main_dir = Path.cwd()
     condor_dir = Path(main_dir / "condor")
-    
-    jobpath = f"{args['processor']}/{args['year']}"
-    if args["processor"] == "tag_eff":
-        jobpath = f'{jobpath}/{args["tagger"]}/{args["flavor"]}/{args["wp"]}'
-        
+    jobpath, jobname = job_names(args)
+
     # create logs directory
     log_dir = Path(condor_dir / "logs" / jobpath)
     if not log_dir.exists():
         log_dir.mkdir(parents=True)
-    
-    # set jobname
-    jobname = f'{args["processor"]}_'
-    jobname += args["fileset"].split("/")[-1].replace(".json", "")
-        
+
     # creal local condor submit file
     local_condor_path = Path(condor_dir / jobpath)
     if not local_condor_path.exists():
@@ -55,13 +77,15 @@ def submit_condor(args: dict) -> None:
         line = line.replace("DIRECTORY", str(condor_dir))
         line = line.replace("JOBNAME", jobname)
         line = line.replace("JOBPATH", jobpath)
-        line = line.replace("JOBFLAVOR", f'"longlunch"')
+        line = line.replace("JOBFLAVOR", f'"{args["job_flavour"]}"')
+        line = line.replace("REQUESTMEMORY", str(args["request_memory"]))
+        line = line.replace("REQUESTCPUS", str(args["request_cpus"]))
         condor_file.write(line)
     condor_file.close()
     condor_template_file.close()
 
     # make executable file
-    x509_path = move_X509() 
+    x509_path = job_proxy(backend)
     sh_template_file = open(f"{condor_dir}/submit.sh")
     local_sh = f"{local_condor_path}/{jobname}.sh"
     sh_file = open(local_sh, "w")
@@ -72,7 +96,68 @@ def submit_condor(args: dict) -> None:
         sh_file.write(line)
     sh_file.close()
     sh_template_file.close()
+    os.chmod(local_sh, 0o755)
+
+    # submit jobs
+    if backend == "condor":
+        print(f"submitting {jobname}")
+        subprocess.run(["condor_submit", local_condor])
+    return local_condor
+
+
+def submit_condor_bulk(jobs: list, name: str, backend: str = "condor") -> str:
+    """
+    submit several jobs as a single cluster: one submit file whose queue
+    statement reads (jobpath, jobname, flavour, memory, cpus, arguments) items
+    from an itemdata file,
+    one executable running 'submit.py <arguments>', one proxy copy and one
+    condor_submit call. Logs keep the condor/logs/<jobpath>/<jobname>.* layout
+
+    Parameters:
+        jobs: args of each job, with the submit.py options in 'arguments'
+        name: name of the submit, executable and itemdata files in condor/bulk/
+        backend: 'condor' or 'local' (files are only built)
+
+    Returns:
+        condor submit file path
+    """
+    main_dir = Path.cwd()
+    condor_dir = Path(main_dir / "condor")
+    bulk_dir = Path(condor_dir / "bulk")
+    bulk_dir.mkdir(parents=True, exist_ok=True)
+
+    # itemdata table, the last column (submit.py arguments) takes the rest of the line
+    items_file = f"{bulk_dir}/{name}.items"
+    with open(items_file, "w") as f:
+        for args in jobs:
+            jobpath, jobname = job_names(args)
+            Path(condor_dir / "logs" / jobpath).mkdir(parents=True, exist_ok=True)
+            f.write(
+                f"{jobpath},{jobname},{args['job_flavour']},{args['request_memory']},"
+                f"{args['request_cpus']},{args['arguments'].strip()}\n"
+            )
+
+    # make condor file
+    local_condor = f"{bulk_dir}/{name}.sub"
+    with open(f"{condor_dir}/submit_bulk.sub") as template, open(local_condor, "w") as f:
+        for line in template:
+            line = line.replace("DIRECTORY", str(condor_dir))
+            line = line.replace("JOBNAME", name)
+            f.write(line)
+
+    # make executable file
+    x509_path = job_proxy(backend)
+    local_sh = f"{bulk_dir}/{name}.sh"
+    with open(f"{condor_dir}/submit.sh") as template, open(local_sh, "w") as f:
+        for line in template:
+            line = line.replace("MAINDIRECTORY", str(main_dir))
+            line = line.replace("COMMAND", 'python3 submit.py "$@"')
+            line = line.replace("X509PATH", x509_path)
+            f.write(line)
+    os.chmod(local_sh, 0o755)
 
     # submit jobs
-    print(f"submitting {jobname}")
-    subprocess.run(["condor_submit", local_condor])
\ No newline at end of file
+    if backend == "condor":
+        print(f"submitting {len(jobs)} jobs from {items_file}")
+        subprocess.run(["condor_submit", local_condor])
+    return local_condor
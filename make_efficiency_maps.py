@@ -0,0 +1,67 @@
+import json
+import glob
+import argparse
+from analysis.configs.working_points import WORKING_POINTS
+from analysis.postprocess.utils import merge_histograms
+from analysis.postprocess.efficiency import build_efficiency_maps, to_correction_json
+
+
+def main(args):
+    # merge the per-partition tag_eff outputs
+    outputs = [
+        path
+        for suffix in ["npz", "pkl"]
+        for path in glob.glob(f"{args.input_path}/**/*.{suffix}", recursive=True)
+    ]
+    if not outputs:
+        raise FileNotFoundError(f"No tag_eff outputs found in {args.input_path}")
+    histograms = merge_histograms(outputs)
+
+    # working points to evaluate in discriminant mode
+    working_points = WORKING_POINTS[args.year]
+    if args.working_points:
+        with open(args.working_points, "r") as f:
+            working_points = json.load(f)
+
+    maps = build_efficiency_maps(histograms, working_points)
+    corrections = to_correction_json(
+        maps, description=f"{args.year} MC tagging efficiency"
+    )
+    output_file = args.output or f"{args.input_path}/efficiency_maps.json"
+    with open(output_file, "w") as f:
+        json.dump(corrections, f, indent=2)
+    print(f"{len(maps)} efficiency maps from {len(outputs)} outputs saved to {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input_path",
+        dest="input_path",
+        type=str,
+        default="",
+        help="directory with the tag_eff outputs, e.g. outputs/tag_eff/2022EE/all/all/all",
+    )
+    parser.add_argument(
+        "--year",
+        dest="year",
+        type=str,
+        default="2022EE",
+        help="year of the data {2022EE}",
+    )
+    parser.add_argument(
+        "--working_points",
+        dest="working_points",
+        type=str,
+        default="",
+        help="JSON file with the working points {flavor: {tagger: {wp: {discriminant: threshold}}}} to evaluate with discriminant mode outputs (default: analysis/configs/working_points.py)",
+    )
+    parser.add_argument(
+        "--output",
+        dest="output",
+        type=str,
+        default="",
+        help="output JSON file (default <input_path>/efficiency_maps.json)",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,182 @@
+import argparse
+from pathlib import Path
+from collections import defaultdict
+from analysis.configs.luminosity import LUMINOSITY
+from analysis.postprocess.merge import discover_outputs, check_partitions, merge_outputs
+from analysis.postprocess.normalization import normalize_outputs
+
+
+def find_outputs(
+    path: str, year: str, processors: list, samples: list, directories: list = None
+) -> dict:
+    """
+    discover_outputs of several processors, restricted to samples and to output
+    directories relative to path (all if empty)
+    """
+    groups = {}
+    for processor in processors:
+        groups.update(discover_outputs(path, year, processor))
+    if samples:
+        groups = {group: outputs for group, outputs in groups.items() if group[1] in samples}
+    if directories:
+        groups = {group: outputs for group, outputs in groups.items() if group[0] in directories}
+    if not groups:
+        raise FileNotFoundError(f"No outputs found in {path}/{{{','.join(processors)}}}/{year}")
+    return groups
+
+
+def merge(args, groups: dict) -> dict:
+    """check the partitions of the discovered outputs and merge them by sample"""
+    # check that every partition of each sample has a complete output
+    samples = args.sample.split(",") if args.sample else []
+    problems = check_partitions(groups, args.year, args.filesets_path, samples)
+    for (directory, sample), problem in problems.items():
+        for kind, keys in problem.items():
+            if keys:
+                print(f"{directory} {sample}: {len(keys)} {kind} partitions {keys}")
+    if problems and not args.allow_missing:
+        raise ValueError(
+            f"{len(problems)} samples have missing, stale or quicklook partitions, "
+            "resubmit them or merge with --allow_missing"
+        )
+    for (directory, sample), problem in problems.items():
+        # quicklook outputs are never merged
+        for key in problem["quicklook"]:
+            del groups[(directory, sample)][key]
+    groups = {group: outputs for group, outputs in groups.items() if outputs}
+
+    merged = merge_outputs(groups, args.output_path, args.workers, args.fan_in)
+    for (directory, sample), metadata in sorted(merged.items()):
+        print(
+            f"{directory}/{sample}: {len(metadata['partitions'])} partitions, "
+            f"sumw {metadata.get('sumw', '-')}"
+        )
+    return merged
+
+
+def main(args):
+    processors = args.processor.split(",") if args.processor else ["*"]
+    samples = args.sample.split(",") if args.sample else []
+    directories = args.output_dirs.split(",") if args.output_dirs else []
+    if args.no_merge:
+        # previously merged outputs, e.g. to normalize once all samples are merged
+        merged = {
+            (directory, sample): outputs[sample][1]
+            for (directory, sample), outputs in find_outputs(
+                args.output_path, args.year, processors, samples, directories
+            ).items()
+            if sample in outputs
+        }
+    else:
+        merged = merge(
+            args, find_outputs(args.input_path, args.year, processors, samples, directories)
+        )
+
+    # scale the merged outputs to xsec * luminosity / sumw and stack them by process
+    if args.normalize:
+        luminosity = args.luminosity or LUMINOSITY[args.year]
+        directories = defaultdict(dict)
+        for (directory, sample), metadata in merged.items():
+            # tag_eff outputs do not record sumw and are not normalized
+            if "sumw" in metadata:
+                directories[directory][sample] = metadata
+        for directory, directory_samples in sorted(directories.items()):
+            normalization = normalize_outputs(
+                f"{args.output_path}/{directory}", directory_samples, args.year, luminosity
+            )
+            for process, process_samples in normalization["processes"].items():
+                print(f"{directory}/processes/{process}: {len(process_samples)} samples")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input_path",
+        dest="input_path",
+        type=str,
+        default=str(Path.cwd() / "outputs"),
+        help="root outputs directory with the <processor>/<year>/... partition outputs (default outputs)",
+    )
+    parser.add_argument(
+        "--output_path",
+        dest="output_path",
+        type=str,
+        default=str(Path.cwd() / "merged"),
+        help="directory where the merged outputs are saved, following the input layout (default merged)",
+    )
+    parser.add_argument(
+        "--processor",
+        dest="processor",
+        type=str,
+        default="",
+        help="processor outputs to merge {tag_eff, signal}, comma-separated (default all)",
+    )
+    parser.add_argument(
+        "--sample",
+        dest="sample",
+        type=str,
+        default="",
+        help="comma-separated samples to merge (default all)",
+    )
+    parser.add_argument(
+        "--output_dirs",
+        dest="output_dirs",
+        type=str,
+        default="",
+        help="comma-separated output directories to merge, relative to input_path (e.g. tag_eff/2022EE/pnet/c/tight), so that outputs of other configurations are not checked nor normalized (default all)",
+    )
+    parser.add_argument(
+        "--year",
+        dest="year",
+        type=str,
+        default="2022EE",
+        help="year of the data {2022EE}",
+    )
+    parser.add_argument(
+        "--filesets_path",
+        dest="filesets_path",
+        type=str,
+        default=str(Path.cwd() / "analysis" / "filesets"),
+        help="directory with the <year>/<sample>_<i>.json partition filesets used to check for missing partitions",
+    )
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=4,
+        help="number of merging processes",
+    )
+    parser.add_argument(
+        "--fan_in",
+        dest="fan_in",
+        type=int,
+        default=8,
+        help="number of outputs merged by each task of the merge tree. Memory per worker is bounded by two outputs",
+    )
+    parser.add_argument(
+        "--allow_missing",
+        dest="allow_missing",
+        action="store_true",
+        help="merge samples with missing or stale partitions (quicklook outputs are skipped)",
+    )
+    parser.add_argument(
+        "--normalize",
+        dest="normalize",
+        action="store_true",
+        help="scale the merged outputs by xsec * luminosity / sumw and stack them by process (analysis/configs/processes.py)",
+    )
+    parser.add_argument(
+        "--no_merge",
+        dest="no_merge",
+        action="store_true",
+        help="do not merge, use the outputs already merged in output_path (e.g. with --normalize once all samples are merged)",
+    )
+    parser.add_argument(
+        "--luminosity",
+        dest="luminosity",
+        type=float,
+        default=None,
+        help="integrated luminosity in pb^-1 (default analysis/configs/luminosity.py)",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,91 @@
+import json
+import time
+import argparse
+from pathlib import Path
+from condor.monitor import monitor_step
+
+
+def main(args):
+    campaign_file = args.campaign
+    if not campaign_file:
+        campaigns = sorted(
+            Path(Path.cwd() / "condor" / "campaigns").glob("*.json"), key=lambda p: p.stat().st_mtime
+        )
+        if not campaigns:
+            raise FileNotFoundError("No campaigns found in condor/campaigns")
+        campaign_file = str(campaigns[-1])
+    with open(campaign_file, "r") as f:
+        campaign = json.load(f)
+    print(f"monitoring {campaign['name']} ({len(campaign['jobs'])} jobs)")
+    while True:
+        jobs_by_status = monitor_step(
+            campaign,
+            campaign_file,
+            args.factor,
+            args.max_duplicates,
+            args.min_finished,
+            args.logs_path,
+        )
+        print(
+            time.strftime("%H:%M:%S"),
+            ", ".join(f"{status} {len(jobs)}" for status, jobs in sorted(jobs_by_status.items())),
+        )
+        if args.once or set(jobs_by_status) <= {"done", "failed"}:
+            break
+        time.sleep(args.interval)
+    for jobname in jobs_by_status.get("failed", []):
+        print(f"{jobname}: failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--campaign",
+        dest="campaign",
+        type=str,
+        default="",
+        help="campaign file written by submit_condor.py in condor/campaigns (default the latest one)",
+    )
+    parser.add_argument(
+        "--factor",
+        dest="factor",
+        type=float,
+        default=3,
+        help="a job running longer than factor times its predicted duration is duplicated (default 3)",
+    )
+    parser.add_argument(
+        "--max_duplicates",
+        dest="max_duplicates",
+        type=int,
+        default=1,
+        help="maximum number of duplicates of a job (default 1)",
+    )
+    parser.add_argument(
+        "--min_finished",
+        dest="min_finished",
+        type=int,
+        default=3,
+        help="finished jobs of a sample needed to predict the duration of its other jobs from their median (default 3)",
+    )
+    parser.add_argument(
+        "--interval",
+        dest="interval",
+        type=float,
+        default=300,
+        help="seconds between checks of the job logs (default 300)",
+    )
+    parser.add_argument(
+        "--once",
+        dest="once",
+        action="store_true",
+        help="check the campaign once and exit (e.g. to run from cron)",
+    )
+    parser.add_argument(
+        "--logs_path",
+        dest="logs_path",
+        type=str,
+        default=str(Path.cwd() / "condor" / "logs"),
+        help="condor logs directory (default condor/logs)",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -1,68 +1,297 @@
 import json
 import time
-import pickle
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from coffea import processor
+from coffea.processor import accumulate
 from humanfriendly import format_timespan
-from analysis.processors.signal import SignalProcessor
-from analysis.processors.tag_eff import TaggingEfficiencyProcessor
+from analysis.processors.multiplexer import ProcessorMultiplexer
 from coffea.nanoevents import NanoEventsFactory, PFNanoAODSchema
+from analysis.execution.chunks import (
+    trim_fileset,
+    sample_chunks,
+    expand_filesets,
+    interleave_chunks,
+    fileset_ranges,
+    restrict_chunks,
+    historical_time_per_event,
+    chunk_costs,
+    lpt_order,
+    makespan_report,
+)
+from analysis.postprocess.utils import load_histograms
+from analysis.execution.outputs import (
+    processor_path,
+    save_output,
+    histograms_files,
+    incremental_fileset,
+)
+from analysis.execution.checkpoint import (
+    Checkpoint,
+    CheckpointFuturesExecutor,
+    chunk_id,
+    run_signature,
+)
+from analysis.execution.manifest import PROCESSORS, processor_arguments, output_manifest
+from analysis.execution.cache import (
+    ResultCache,
+    CachingProcessor,
+    processor_fingerprint,
+    dataset_fingerprint,
+    chunk_key,
+    workitem_metadata,
+)
 
 
 def main(args):
     # define processors and executors
-    processors = {
-        "tag_eff": TaggingEfficiencyProcessor,
-        "signal": SignalProcessor,
-    }
-    processor_args = {
-        "tag_eff": {
-            "year": args.year,
-            "tagger": args.tagger,
-            "flavor": args.flavor,
-            "wp": args.wp,
-        },
-        "signal": {
-            "year": args.year,
-        }
-    }
+    processors = PROCESSORS
+    processor_args = processor_arguments(vars(args))
     executors = {
-        "iterative": processor.iterative_executor,
-        "futures": processor.futures_executor,
-        "dask": processor.dask_executor,
-    }
-    executor_args = {
-        "schema": PFNanoAODSchema,
+        "iterative": processor.IterativeExecutor,
+        "futures": processor.FuturesExecutor,
+        "dask": processor.DaskExecutor,
     }
+    executor_args = {}
     if args.executor == "futures":
-        executor_args.update({"workers": 4})
-        
-    # load fileset and execute the processor
-    with open(args.fileset) as f:
-        fileset = json.load(f)
-    fileset_key = args.fileset.split("/")[-1].replace(".json", "")
-    
+        executor_args.update({"workers": args.workers})
+    runner = processor.Runner(
+        executor=executors[args.executor](**executor_args),
+        schema=PFNanoAODSchema,
+    )
+
+    # load filesets, several filesets are processed together through the same
+    # executor pool with their chunks interleaved
+    fileset_paths = expand_filesets(args.fileset)
+    fileset, fileset_sources = {}, {}
+    for fileset_path in fileset_paths:
+        with open(fileset_path) as f:
+            partition = trim_fileset(json.load(f), args.nfiles)
+        duplicates = [key for key in partition if key in fileset]
+        if duplicates:
+            raise ValueError(
+                f"Datasets {duplicates} of {fileset_path} are already in "
+                f"{sorted({fileset_sources[key] for key in duplicates})}"
+            )
+        fileset.update(partition)
+        fileset_sources.update({key: fileset_path for key in partition})
+
+    # several processors run over the same chunks, reading the data once
+    processor_names = args.processor.split(",")
+    processor_instance = ProcessorMultiplexer(
+        {
+            name: processors[name](**processor_args[name])
+            for name in processor_names
+        }
+    )
+
+    # with several processors, output_path is the outputs root directory
+    output_paths = {name: args.output_path for name in processor_names}
+    if len(processor_names) > 1:
+        output_paths = {
+            name: f"{args.output_path}/{processor_path(vars(args), name)}"
+            for name in processor_names
+        }
+
+    # incremental mode: only process the files that are not in the previous
+    # outputs, the new results are merged into them
+    previous = {}
+    if args.incremental:
+        all_fileset = fileset
+        fileset, previous = incremental_fileset(fileset, output_paths)
+        for key in all_fileset:
+            if key not in fileset:
+                print(f"{key}: no new files")
+            elif key in previous:
+                print(f"{key}: {len(fileset[key])} new files")
+        if not fileset:
+            return
+
     t0 = time.monotonic()
-    out = processor.run_uproot_job(
-        fileset,
-        treename="Events",
-        processor_instance=processors[args.processor](**processor_args[args.processor]),
-        executor=executors[args.executor],
-        executor_args=executor_args,
+    # fileset items can be entry ranges of a file, only those entries are processed
+    files, entry_ranges = fileset_ranges(fileset)
+    chunks = restrict_chunks(list(runner.preprocess(files, treename="Events")), entry_ranges)
+    # quick-look mode: process a sample of chunks spread over all files
+    chunks = sample_chunks(chunks, args.maxchunks, args.maxevents)
+
+    # order chunks longest-processing-time first. Chunk costs are estimated
+    # from the number of entries and the time per event of previous runs.
+    # The predicted makespan is compared with the fileset order coffea would dispatch
+    time_per_event = historical_time_per_event(
+        {
+            key: [f"{path}/{key}_metadata.json" for path in output_paths.values()]
+            for key in fileset
+        }
+    )
+    costs = chunk_costs(chunks, time_per_event)
+    interleaved_chunks = interleave_chunks(chunks)
+    ordered_chunks = interleaved_chunks
+    if args.ordering == "lpt":
+        ordered_chunks = lpt_order(
+            interleaved_chunks, chunk_costs(interleaved_chunks, time_per_event)
+        )
+    schedule = makespan_report(
+        chunks, costs, args.workers if args.executor == "futures" else 1, ordered_chunks
+    )
+    schedule["unit"] = "seconds" if time_per_event else "events"
+    print(
+        f"predicted makespan ({schedule['unit']}): naive {schedule['naive']:.4g}, "
+        f"{args.ordering} {schedule['ordered']:.4g}, lower bound {schedule['lower_bound']:.4g}"
     )
+
+    # resume from a previous checkpoint of a run with the same arguments
+    signature = run_signature(
+        {
+            "processor": processor_names,
+            "processor_args": {name: processor_args[name] for name in processor_names},
+            "fileset": fileset,
+            "maxchunks": args.maxchunks,
+            "maxevents": args.maxevents,
+        }
+    )
+    checkpoint = Checkpoint(
+        f"{args.output_path}/.checkpoint_{signature[:16]}.pkl", signature
+    )
+    out, done = checkpoint.load()
+    pending_chunks = [chunk for chunk in ordered_chunks if chunk_id(chunk) not in done]
+    if done:
+        print(f"resuming from {checkpoint}: {len(done)} chunks already processed")
+
+    # serve unchanged chunks from the result cache, the other chunks are
+    # stored in the cache by the workers
+    run_processor = processor_instance
+    if args.cache_dir:
+        cache = ResultCache(args.cache_dir, int(args.cache_size * 1e9))
+        fingerprint = processor_fingerprint(
+            processor_instance, {name: processor_args[name] for name in processor_names}
+        )
+        dataset_fingerprints = {
+            key: dataset_fingerprint(key, args.year) for key in fileset
+        }
+        cached_chunks = []
+        for chunk in pending_chunks:
+            key = chunk_key(
+                fingerprint, dataset_fingerprints[chunk.dataset], workitem_metadata(chunk)
+            )
+            if key in cache:
+                out = accumulate([cache.get(key)], out)
+                done.add(chunk_id(chunk))
+                cached_chunks.append(chunk)
+        pending_chunks = [chunk for chunk in pending_chunks if chunk_id(chunk) not in done]
+        print(f"{len(cached_chunks)} chunks served from {cache}")
+        run_processor = CachingProcessor(
+            processor_instance,
+            args.cache_dir,
+            cache.max_size,
+            fingerprint,
+            dataset_fingerprints,
+        )
+
+    if args.executor == "futures" and pending_chunks:
+        # all chunks go through one process pool in the planned order, the
+        # checkpoints are saved from the completed chunks (every 900 seconds by default)
+        interval = 900 if args.checkpoint_interval is None else args.checkpoint_interval
+
+        def save_checkpoint(wrapped_out, items):
+            checkpoint.save(
+                accumulate([out, wrapped_out["out"]]), done | {chunk_id(item) for item in items}
+            )
+
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            runner.executor = CheckpointFuturesExecutor(
+                pool=pool,
+                workers=args.workers,
+                checkpoint=save_checkpoint if interval >= 0 else None,
+                interval=interval,
+            )
+            run_out = runner.run(pending_chunks, processor_instance=run_processor)["out"]
+        out = accumulate([run_out], out)
+        done.update(chunk_id(chunk) for chunk in pending_chunks)
+    else:
+        # process chunks in batches, persisting the merged output and the
+        # completed chunks every checkpoint_interval seconds (if given)
+        batch_size = len(pending_chunks)
+        checkpointing = args.checkpoint_interval is not None and args.checkpoint_interval >= 0
+        if checkpointing:
+            batch_size = 4 * (args.workers if args.executor == "futures" else 1)
+        last_checkpoint = time.monotonic()
+        for i in range(0, len(pending_chunks), max(batch_size, 1)):
+            batch = pending_chunks[i : i + batch_size]
+            batch_out = runner.run(batch, processor_instance=run_processor)["out"]
+            out = accumulate([batch_out], out)
+            done.update(chunk_id(chunk) for chunk in batch)
+            if (
+                checkpointing
+                and time.monotonic() - last_checkpoint >= args.checkpoint_interval
+                and len(done) < len(ordered_chunks)
+            ):
+                checkpoint.save(out, done)
+                last_checkpoint = time.monotonic()
     exec_time = format_timespan(time.monotonic() - t0)
 
-    # save processor output and metadata
-    metadata = {"walltime": exec_time}
-    metadata.update({"fileset": fileset[fileset_key]})
-    if "metadata" in out[fileset_key]:
-        output_metadata = out[fileset_key]["metadata"]
-        metadata.update({"sumw": float(output_metadata["sumw"])})
-    
-    with open(f"{args.output_path}/{fileset_key}_metadata.json", "w") as f:
-        f.write(json.dumps(metadata))
-    with open(f"{args.output_path}/{fileset_key}.pkl", "wb") as handle:
-        pickle.dump(out[fileset_key]["histograms"], handle, protocol=pickle.HIGHEST_PROTOCOL)
+    # save processors output and metadata by fileset. Datasets without
+    # chunks (empty files or quick-look sampling) have no output
+    for fileset_key in fileset:
+        fileset_chunks = [chunk for chunk in chunks if chunk.dataset == fileset_key]
+        if not fileset_chunks or out is None:
+            print(f"{fileset_key}: no chunks processed, no output saved")
+            continue
+        for name in processor_names:
+            processor_out = out["outputs"][name]
+            metadata = {"walltime": exec_time}
+            if len(fileset) > 1:
+                metadata.update({"batch": list(fileset)})
+            # processor cpu time in seconds
+            metadata.update({"cputime": out["cputime"][name][fileset_key]})
+            metadata.update({"fileset": fileset[fileset_key]})
+            metadata.update(
+                {"nevents": sum(len(chunk) for chunk in fileset_chunks)}
+            )
+            metadata.update({"schedule": schedule})
+            if args.maxchunks or args.maxevents:
+                metadata.update(
+                    {
+                        "quicklook": {
+                            "chunks": len(fileset_chunks),
+                            "events": sum(len(chunk) for chunk in fileset_chunks),
+                        }
+                    }
+                )
+            if "metadata" in processor_out[fileset_key]:
+                output_metadata = processor_out[fileset_key]["metadata"]
+                metadata.update({"sumw": float(output_metadata["sumw"])})
+
+            # merge new results into the previous output
+            histograms = processor_out[fileset_key]["histograms"]
+            if fileset_key in previous:
+                previous_metadata = previous[fileset_key][name]
+                histograms = accumulate(
+                    [histograms],
+                    load_histograms(histograms_files(output_paths[name], fileset_key)[0]),
+                )
+                metadata["fileset"] = previous_metadata["fileset"] + metadata["fileset"]
+                for field in ["cputime", "nevents", "sumw"]:
+                    if field in previous_metadata:
+                        metadata[field] += previous_metadata[field]
+                metadata["incremental"] = len(fileset[fileset_key])
+            # inputs, code and arguments the output is valid for
+            metadata["manifest"] = output_manifest(name, vars(args), metadata["fileset"])
+
+            Path(output_paths[name]).mkdir(parents=True, exist_ok=True)
+            save_output(
+                histograms,
+                metadata,
+                output_paths[name],
+                fileset_key,
+                output_format=args.output_format,
+            )
+            print(f"{fileset_key} {name} cputime: {format_timespan(metadata['cputime'])}")
+
+    # outputs are complete, the checkpoint is not needed anymore
+    checkpoint.remove()
+    if args.cache_dir:
+        cache.evict()
 
 
 if __name__ == "__main__":
@@ -72,7 +301,14 @@ if __name__ == "__main__":
         dest="processor",
         type=str,
         default="tag_eff",
-        help="processor to be used {tag_eff, signal}",
+        help="processor to be used {tag_eff, signal}. Several comma-separated processors (e.g. signal,tag_eff) run over a single read of the data",
+    )
+    parser.add_argument(
+        "--sample",
+        dest="sample",
+        type=str,
+        default="",
+        help="sample to be processed",
     )
     parser.add_argument(
         "--executor",
@@ -85,8 +321,9 @@ if __name__ == "__main__":
         "--fileset",
         dest="fileset",
         type=str,
-        default="",
-        help="fileset path",
+        nargs="+",
+        default=[],
+        help="fileset path. Several paths or glob patterns (e.g. 'analysis/filesets/2022EE/*H*.json') are processed together in one worker pool, writing one output per fileset",
     )
     parser.add_argument(
         "--year",
@@ -100,28 +337,56 @@ if __name__ == "__main__":
         dest="output_path",
         type=str,
         default="",
-        help="output path",
+        help="output path. With several processors, root outputs directory where each processor writes to <processor>/<year>/...",
+    )
+    parser.add_argument(
+        "--output_format",
+        dest="output_format",
+        type=str,
+        default="npz",
+        help="histograms output format {npz, npz_uncompressed, pickle}. npz: compressed arrays with axes metadata, read per histogram. npz_uncompressed: memory-mapped on load (default npz)",
     )
     parser.add_argument(
         "--tagger",
         dest="tagger",
         type=str,
         default="pnet",
-        help="tagger {pnet, part, deepjet}",
+        help="tagger {pnet, part, deepjet, all}",
     )
     parser.add_argument(
         "--wp",
         dest="wp",
         type=str,
         default="tight",
-        help="working point {loose, medium, tight}",
+        help="working point {loose, medium, tight, all}",
+    )
+    parser.add_argument(
+        "--mode",
+        dest="mode",
+        type=str,
+        default="wp",
+        help="tag_eff filling mode {wp, discriminant} (default wp)",
     )
     parser.add_argument(
         "--flavor",
         dest="flavor",
         type=str,
         default="c",
-        help="Hadron flavor {c, b}",
+        help="Hadron flavor {c, b, all}",
+    )
+    parser.add_argument(
+        "--efficiency_maps",
+        dest="efficiency_maps",
+        type=str,
+        default="",
+        help="tagging efficiency maps JSON used by the signal processor to compute c-tagging weights",
+    )
+    parser.add_argument(
+        "--scale_factors",
+        dest="scale_factors",
+        type=str,
+        default="",
+        help="c-tagging scale factors JSON (same format as the efficiency maps)",
     )
     parser.add_argument(
         "--workers",
@@ -135,7 +400,55 @@ if __name__ == "__main__":
         dest="nfiles",
         type=int,
         default=-1,
-        help="number of .root files to be processed by sample. To run all files use -1 (default 1)",
+        help="number of .root files to be processed by sample. To run all files use -1 (default -1)",
+    )
+    parser.add_argument(
+        "--ordering",
+        dest="ordering",
+        type=str,
+        default="lpt",
+        help="chunks dispatch order {lpt, fileset}. lpt: longest-processing-time first (default lpt)",
+    )
+    parser.add_argument(
+        "--checkpoint_interval",
+        dest="checkpoint_interval",
+        type=int,
+        default=None,
+        help="seconds between checkpoints of the merged output and completed chunks. A run restarted with the same arguments resumes from the checkpoint. Use -1 to disable. With the futures executor checkpoints are saved from the completed chunks of a single pool (default 900), with the other executors chunks are processed in batches only if it is given",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        dest="cache_dir",
+        type=str,
+        default="",
+        help="local directory of the per-chunk result cache. Chunks whose processor code, arguments, dataset config and input are unchanged are read from the cache (default: cache disabled)",
+    )
+    parser.add_argument(
+        "--cache_size",
+        dest="cache_size",
+        type=float,
+        default=5,
+        help="maximum size of the result cache in GB, least recently used entries are evicted (default 5)",
+    )
+    parser.add_argument(
+        "--incremental",
+        dest="incremental",
+        action="store_true",
+        help="only process the files that are not recorded in the metadata of the previous outputs and merge the results into them. Partitions whose previous files changed are processed in full, use stable partitioning so that adding files to a sample keeps its other partitions",
+    )
+    parser.add_argument(
+        "--maxchunks",
+        dest="maxchunks",
+        type=int,
+        default=None,
+        help="quick-look mode: maximum number of chunks to process by sample, evenly sampled over all files",
+    )
+    parser.add_argument(
+        "--maxevents",
+        dest="maxevents",
+        type=int,
+        default=None,
+        help="quick-look mode: approximate maximum number of events to process by sample, evenly sampled over all files",
     )
 
     args = parser.parse_args()
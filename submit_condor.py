@@ -1,46 +1,238 @@
-import os
-import glob
+import json
+import time
+import subprocess
 import argparse
+import itertools
+import numpy as np
 from pathlib import Path
-from condor.utils import submit_condor
-from analysis.configs.load_config import load_config
+from collections import defaultdict
+from condor.utils import submit_condor, submit_condor_bulk, job_proxy
+from condor.dag import write_dag, run_dag_local
+from condor.local import run_local
+from condor.user_logs import job_resources
+from condor.monitor import write_campaign
+from analysis.filesets.index import FileIndex
 from analysis.filesets.utils import build_filesets
+from analysis.execution.outputs import processor_path, load_metadata
+from analysis.execution.chunks import historical_time_per_event, trim_fileset
+from analysis.execution.manifest import output_manifest, manifest_mismatch
+
+
+def submit_arguments(args: dict) -> str:
+    """submit.py options of a job"""
+    arguments = (
+        f"--processor {args['processor']} "
+        f"--sample {args['sample']} "
+        f"--year {args['year']} "
+        f"--output_path {args['output_path']} "
+        f"--workers {args['workers']} "
+        f"--nfiles {args['nfiles']} "
+        f"--executor {args['executor']} "
+        f"--fileset {args['fileset']} "
+        f"--tagger {args['tagger']} "
+        f"--flavor {args['flavor']} "
+        f"--wp {args['wp']} "
+        f"--mode {args['mode']} "
+    )
+    if args["efficiency_maps"]:
+        arguments += (
+            f"--efficiency_maps {args['efficiency_maps']} "
+            f"--scale_factors {args['scale_factors']} "
+        )
+    return arguments
+
+
+def sample_time_per_event(args: dict, processors: list, report: dict) -> float:
+    """
+    time per event of the processors on a sample from the metadata of its
+    previous outputs, or from the condor log report of its previous jobs.
+    args['time_per_event'] if there are none
+    """
+    metadata_files = defaultdict(list)
+    for processor in processors:
+        output_path = Path(Path.cwd() / "outputs" / processor_path(args, processor))
+        for path in output_path.glob(f"{args['sample']}*_metadata.json"):
+            key = path.name[: -len("_metadata.json")]
+            if args["sample"] in [key, key.rsplit("_", 1)[0]]:
+                metadata_files[key].append(str(path))
+    time_per_event = historical_time_per_event(metadata_files)
+    if not time_per_event:
+        return report.get(args["sample"], {}).get("time_per_event") or args["time_per_event"]
+    return float(np.mean(list(time_per_event.values())))
+
+
+def output_status(job_args: dict, processors: list, key: str) -> tuple:
+    """
+    status of the outputs of a partition for all the processors:
+        missing: some processor has no output (or a quicklook one)
+        invalid: the manifest of some output does not match the partition
+            input files, the processor code or the job arguments
+        complete: all outputs exist and are valid
+
+    Returns:
+        status, mismatching manifest fields
+    """
+    with open(job_args["fileset"], "r") as f:
+        items = trim_fileset(json.load(f), job_args["nfiles"])[key]
+    mismatch = set()
+    for processor in processors:
+        metadata = load_metadata(f"{Path.cwd()}/outputs/{processor_path(job_args, processor)}", key)
+        if metadata is None or "quicklook" in metadata:
+            return "missing", []
+        mismatch.update(manifest_mismatch(metadata, output_manifest(processor, job_args, items)))
+    return ("invalid" if mismatch else "complete"), sorted(mismatch)
+
+
+def estimated_duration(job_args: dict, index: FileIndex) -> float:
+    """expected duration in seconds of a job from the entries of its fileset"""
+    with open(job_args["fileset"], "r") as f:
+        items = [item for items in json.load(f).values() for item in items]
+    files_info = index.get([item for item in items if not isinstance(item, dict)])
+    entries = sum(
+        item["entry_stop"] - item["entry_start"]
+        if isinstance(item, dict)
+        else files_info[item]["entries"]
+        for item in items
+    )
+    return entries * job_args["time_per_event"] / max(job_args["workers"], 1)
+
+
+def pack_jobs(jobs: list, pack_duration: float, index: FileIndex) -> list:
+    """
+    pack jobs shorter than pack_duration that write to the same output path
+    into jobs of at most pack_duration (first-fit decreasing). A packed job
+    runs submit.py once with all its filesets (--fileset a.json b.json ...),
+    processing them through the same executor and saving the usual per
+    fileset outputs
+    """
+    groups = defaultdict(list)
+    for job_args in jobs:
+        groups[job_args["output_path"]].append(job_args)
+    packed_jobs = []
+    for group in groups.values():
+        durations = [estimated_duration(job_args, index) for job_args in group]
+        bins = []
+        for i in np.argsort(durations, kind="stable")[::-1]:
+            if durations[i] >= pack_duration:
+                packed_jobs.append(group[i])
+                continue
+            for packed in bins:
+                if packed["duration"] + durations[i] <= pack_duration:
+                    packed["duration"] += durations[i]
+                    packed["jobs"].append(group[i])
+                    break
+            else:
+                bins.append({"duration": durations[i], "jobs": [group[i]]})
+        for packed in bins:
+            job_args = {
+                **packed["jobs"][0],
+                "sample": ",".join(dict.fromkeys(job["sample"] for job in packed["jobs"])),
+                "fileset": " ".join(sorted(job["fileset"] for job in packed["jobs"])),
+            }
+            job_args["arguments"] = submit_arguments(job_args)
+            job_args["cmd"] = f"python3 submit.py {job_args['arguments']}"
+            packed_jobs.append(job_args)
+    return packed_jobs
 
 
 def main(args):
     args = vars(args)
-    build_filesets(args)
-    filesets_path = f"{Path.cwd()}/analysis/filesets/{args['year']}"
-    filesets = glob.glob(f"{filesets_path}/{args['sample']}*.json")
-
-    dataset_config = load_config(
-        config_type="dataset", config_name=args["sample"], year=args["year"]
-    )    
-    
-    output_path = Path(Path.cwd() / "outputs" / args["processor"] / args["year"])
-    if args["processor"] == "tag_eff":
-        output_path = Path(output_path / args["tagger"] / args["flavor"] / args["wp"])
-    if not output_path.exists():
-        output_path.mkdir(parents=True)
-    args["output_path"] = str(output_path)
-
-    for partition, fileset in enumerate(filesets, start=1):
-        args["fileset"] = fileset
-        args["cmd"] = (
-            "python3 submit.py "
-            f"--processor {args['processor']} "
-            f"--sample {args['sample']} "
-            f"--year {args['year']} "
-            f"--output_path {args['output_path']} "
-            f"--workers {args['workers']} "
-            f"--nfiles {args['nfiles']} "
-            f"--executor {args['executor']} "
-            f"--fileset {args['fileset']} "
-            f"--tagger {args['tagger']} "
-            f"--flavor {args['flavor']} "
-            f"--wp {args['wp']} "
-        )
-        submit_condor(args)
+    processors = args["processor"].split(",")
+
+    # tag_eff configurations, comma-separated values are expanded into all combinations
+    configs = [{}]
+    if "tag_eff" in processors:
+        configs = [
+            {"tagger": tagger, "flavor": flavor, "wp": wp}
+            for tagger, flavor, wp in itertools.product(
+                args["tagger"].split(","), args["flavor"].split(","), args["wp"].split(",")
+            )
+        ]
+
+    # per sample statistics of the previous jobs (analyze_condor_logs.py)
+    report = {}
+    report_path = Path(args["log_report"] or f"{Path.cwd()}/condor/log_report_{args['year']}.json")
+    if report_path.exists():
+        with open(report_path, "r") as f:
+            report = json.load(f)
+
+    jobs = []
+    for sample in args["sample"].split(","):
+        sample_args = {**args, "sample": sample}
+        if args["target_duration"] or args["pack_duration"]:
+            sample_args["time_per_event"] = sample_time_per_event(
+                {**sample_args, **configs[0]}, processors, report
+            )
+        filesets, _ = build_filesets(sample_args)
+
+        for config in configs:
+            job_args = {**sample_args, **config}
+            # with several processors each one writes to its own directory under outputs/
+            output_path = Path(Path.cwd() / "outputs")
+            for processor in processors:
+                Path(output_path / processor_path(job_args, processor)).mkdir(
+                    parents=True, exist_ok=True
+                )
+            if len(processors) == 1:
+                output_path = Path(output_path / processor_path(job_args, processors[0]))
+            job_args["output_path"] = str(output_path)
+
+            statuses = defaultdict(list)
+            for key, fileset in sorted(filesets.items()):
+                job_args = {**job_args, "fileset": fileset}
+                # partitions with complete outputs are not resubmitted
+                status, mismatch = "missing", []
+                if not args["force"]:
+                    status, mismatch = output_status(job_args, processors, key)
+                statuses[status].append(key)
+                if status == "invalid":
+                    print(f"{key}: outputs out of date ({', '.join(mismatch)} changed)")
+                if status == "complete" or (status == "invalid" and args["only_missing"]):
+                    continue
+                job_args["arguments"] = submit_arguments(job_args)
+                job_args["cmd"] = f"python3 submit.py {job_args['arguments']}"
+                jobs.append(job_args)
+            print(
+                f"{sample}: "
+                + ", ".join(f"{len(keys)} {status}" for status, keys in sorted(statuses.items()))
+                + " partitions"
+            )
+
+    if not jobs:
+        print("no partitions without complete outputs, nothing to submit")
+        return
+    if args["pack_duration"]:
+        njobs = len(jobs)
+        index = FileIndex(f"{Path.cwd()}/analysis/filesets/index_{args['year']}.json")
+        jobs = pack_jobs(jobs, args["pack_duration"], index)
+        print(f"{njobs} partitions packed into {len(jobs)} jobs")
+    # request_memory, request_cpus and JobFlavour from the logs of the previous jobs
+    for job_args in jobs:
+        job_args.update(job_resources(job_args, report))
+    submitted = time.strftime("%Y-%m-%d %H:%M:%S")
+    name = f"{'+'.join(processors)}_{args['year']}_{time.strftime('%Y%m%d_%H%M%S')}"
+    if args["dag"]:
+        dag_file = write_dag(jobs, name, args["retries"], job_proxy(args["backend"]))
+        if args["backend"] == "local":
+            status = run_dag_local(dag_file, args["max_jobs"])
+            for node, node_status in status.items():
+                if node_status != "done":
+                    print(f"{node}: {node_status}")
+            print(f"{sum(s == 'done' for s in status.values())}/{len(status)} nodes done")
+        else:
+            print(f"submitting {len(jobs)} jobs from {dag_file}")
+            subprocess.run(["condor_submit_dag", dag_file])
+    else:
+        if args["bulk"]:
+            submit_files = [submit_condor_bulk(jobs, name=name, backend=args["backend"])]
+        else:
+            submit_files = [submit_condor(job_args, backend=args["backend"]) for job_args in jobs]
+        # with the local backend the same submit files are run on this machine
+        if args["backend"] == "local":
+            run_local(submit_files, args["max_jobs"])
+        else:
+            # followed by monitor_campaign.py, which duplicates stragglers
+            print(f"campaign saved to {write_campaign(jobs, name, submitted)}")
 
 
 if __name__ == "__main__":
@@ -50,14 +242,14 @@ if __name__ == "__main__":
         dest="processor",
         type=str,
         default="tag_eff",
-        help="processor to be used {tag_eff, signal}",
+        help="processor to be used {tag_eff, signal}. Several comma-separated processors (e.g. signal,tag_eff) run over a single read of the data",
     )
     parser.add_argument(
         "--sample",
         dest="sample",
         type=str,
         default="",
-        help="sample to be processed",
+        help="sample to be processed. Several comma-separated samples can be submitted at once",
     )
     parser.add_argument(
         "--year",
@@ -73,6 +265,20 @@ if __name__ == "__main__":
         default="futures",
         help="executor to be used {iterative, futures, dask} (default iterative)",
     )
+    parser.add_argument(
+        "--efficiency_maps",
+        dest="efficiency_maps",
+        type=str,
+        default="",
+        help="tagging efficiency maps JSON used by the signal processor to compute c-tagging weights",
+    )
+    parser.add_argument(
+        "--scale_factors",
+        dest="scale_factors",
+        type=str,
+        default="",
+        help="c-tagging scale factors JSON (same format as the efficiency maps)",
+    )
     parser.add_argument(
         "--workers",
         dest="workers",
@@ -85,28 +291,122 @@ if __name__ == "__main__":
         dest="nfiles",
         type=int,
         default=-1,
-        help="number of .root files to be processed by sample. To run all files use -1 (default 1)",
+        help="number of .root files to be processed by sample. To run all files use -1 (default -1)",
     )
     parser.add_argument(
         "--tagger",
         dest="tagger",
         type=str,
         default="pnet",
-        help="tagger {pnet, part, deepjet}",
+        help="tagger {pnet, part, deepjet, all}. Comma-separated values submit one tag_eff job per tagger",
     )
     parser.add_argument(
         "--wp",
         dest="wp",
         type=str,
         default="tight",
-        help="working point {loose, medium, tight}",
+        help="working point {loose, medium, tight, all}. Comma-separated values submit one tag_eff job per working point",
+    )
+    parser.add_argument(
+        "--mode",
+        dest="mode",
+        type=str,
+        default="wp",
+        help="tag_eff filling mode {wp, discriminant} (default wp)",
     )
     parser.add_argument(
         "--flavor",
         dest="flavor",
         type=str,
         default="c",
-        help="Hadron flavor {c, b}",
+        help="Hadron flavor {c, b, all}. Comma-separated values submit one tag_eff job per flavor",
+    )
+    parser.add_argument(
+        "--partitioning",
+        dest="partitioning",
+        type=str,
+        default="count",
+        help="how sample files are split into partitions {count, balanced, stable}. count: dataset config partitions with the same number of files. balanced: files bin-packed by entries or bytes from the cached file index. stable: consistent hashing with bounded loads, so adding files only changes (and resubmits) a few partitions (default count)",
+    )
+    parser.add_argument(
+        "--balance_by",
+        dest="balance_by",
+        type=str,
+        default="entries",
+        help="file cost used by balanced partitioning {entries, bytes} (default entries)",
+    )
+    parser.add_argument(
+        "--target_duration",
+        dest="target_duration",
+        type=float,
+        default=0,
+        help="target job duration in seconds. With balanced partitioning, the number of partitions is chosen from the sample entries and time per event instead of the dataset config",
+    )
+    parser.add_argument(
+        "--time_per_event",
+        dest="time_per_event",
+        type=float,
+        default=1e-3,
+        help="processing time per event in seconds used with --target_duration when there are no previous outputs of the sample (default 1e-3)",
+    )
+    parser.add_argument(
+        "--pack_duration",
+        dest="pack_duration",
+        type=float,
+        default=0,
+        help="pack partitions expected to take less than this many seconds (e.g. small samples submitted together with comma-separated --sample) into jobs of up to this duration",
+    )
+    parser.add_argument(
+        "--bulk",
+        dest="bulk",
+        action="store_true",
+        help="submit all the jobs as a single cluster with one condor_submit call (queue from an itemdata table)",
+    )
+    parser.add_argument(
+        "--dag",
+        dest="dag",
+        action="store_true",
+        help="submit the jobs as a DAGMan campaign: processing nodes with retries, a merge node per sample and a final normalization node",
+    )
+    parser.add_argument(
+        "--backend",
+        dest="backend",
+        type=str,
+        default="condor",
+        help="where the jobs (or the campaign DAG) run {condor, local}. local runs the same condor submit files on this machine, --max_jobs at a time, with the logs in condor/logs (default condor)",
+    )
+    parser.add_argument(
+        "--retries",
+        dest="retries",
+        type=int,
+        default=2,
+        help="number of retries of a failed DAG node (default 2)",
+    )
+    parser.add_argument(
+        "--max_jobs",
+        dest="max_jobs",
+        type=int,
+        default=4,
+        help="maximum number of jobs (or DAG nodes) running at the same time with the local backend (default 4)",
+    )
+    parser.add_argument(
+        "--log_report",
+        dest="log_report",
+        type=str,
+        default="",
+        help="condor log report of previous jobs (analyze_condor_logs.py) used to set request_memory, request_cpus and JobFlavour, and the time per event of samples without previous outputs (default condor/log_report_<year>.json, if it exists)",
+    )
+    parser.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="submit all the partitions, also those with complete outputs",
+    )
+    parser.add_argument(
+        "--only_missing",
+        dest="only_missing",
+        action="store_true",
+        help="only submit the partitions without outputs (e.g. failed jobs), keeping outputs whose manifest does not match the current inputs, code or arguments",
     )
     args = parser.parse_args()
     main(args)
\ No newline at end of file
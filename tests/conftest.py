@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the analysis and condor packages are imported from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
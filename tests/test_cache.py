@@ -0,0 +1,87 @@
+import os
+import time
+from analysis.configs.load_config import load_config
+from analysis.processors.signal import SignalProcessor
+from analysis.execution.cache import (
+    ResultCache,
+    chunk_key,
+    dataset_fingerprint,
+    processor_fingerprint,
+    arguments_fingerprint,
+)
+
+METADATA = {
+    "dataset": "ZZto4L_1",
+    "filename": "/store/ZZto4L/file_1.root",
+    "treename": "Events",
+    "entrystart": 0,
+    "entrystop": 100000,
+    "fileuuid": "6f8a1c2e-0b1d-11ee-9c8a-0242ac120002",
+}
+
+
+def test_chunk_key_identifies_the_chunk():
+    key = chunk_key("code", "dataset", METADATA)
+    assert key == chunk_key("code", "dataset", dict(METADATA))
+    assert key != chunk_key("other code", "dataset", METADATA)
+    assert key != chunk_key("code", "other dataset", METADATA)
+    assert key != chunk_key("code", "dataset", {**METADATA, "entrystart": 1})
+    assert key != chunk_key("code", "dataset", {**METADATA, "fileuuid": "other"})
+
+
+def test_chunk_key_without_uuid_uses_the_filename():
+    metadata = {**METADATA, "fileuuid": ""}
+    assert chunk_key("code", "dataset", metadata) != chunk_key(
+        "code", "dataset", {**metadata, "filename": "/store/ZZto4L/file_2.root"}
+    )
+
+
+def test_dataset_fingerprint_ignores_the_file_list(monkeypatch):
+    config = load_config(config_type="dataset", config_name="ZZto4L", year="2022EE")
+    fingerprint = dataset_fingerprint("ZZto4L_1", "2022EE")
+    assert fingerprint == dataset_fingerprint("ZZto4L", "2022EE")
+    monkeypatch.setattr(config, "filenames", tuple(config.filenames) + ("new_file.root",))
+    monkeypatch.setattr(config, "partitions", config.partitions + 1)
+    assert dataset_fingerprint("ZZto4L_1", "2022EE") == fingerprint
+    monkeypatch.setattr(config, "xsec", 2 * config.xsec)
+    assert dataset_fingerprint("ZZto4L_1", "2022EE") != fingerprint
+
+
+def test_dataset_fingerprint_of_unknown_dataset():
+    assert dataset_fingerprint("unknown_sample_1", "2022EE") == ""
+
+
+def test_processor_fingerprint_depends_on_arguments(tmp_path):
+    instance = SignalProcessor(year="2022EE")
+    fingerprint = processor_fingerprint(instance, {"signal": {"year": "2022EE"}})
+    assert fingerprint == processor_fingerprint(instance, {"signal": {"year": "2022EE"}})
+    assert fingerprint != processor_fingerprint(instance, {"signal": {"year": "2023"}})
+
+    # arguments pointing to files are hashed by content
+    maps = tmp_path / "maps.json"
+    maps.write_text("{}")
+    before = arguments_fingerprint({"efficiency_maps": str(maps)})
+    maps.write_text('{"corrections": []}')
+    assert arguments_fingerprint({"efficiency_maps": str(maps)}) != before
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = ResultCache(tmp_path, max_size=10**6)
+    assert "key" not in cache
+    cache.put("key", {"sumw": 1.5})
+    assert "key" in cache
+    assert cache.get("key") == {"sumw": 1.5}
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path, max_size=10**9)
+    for i, key in enumerate(["aa1", "bb2", "cc3"]):
+        cache.put(key, os.urandom(1000))
+        entry = cache._entry(key)
+        os.utime(entry, (time.time() - 100 + i, time.time() - 100 + i))
+    # reading an entry makes it the most recently used
+    cache.get("aa1")
+    cache.max_size = 2 * cache._entry("bb2").stat().st_size + 10
+    assert cache.evict() == 1
+    assert "bb2" not in cache
+    assert "aa1" in cache and "cc3" in cache
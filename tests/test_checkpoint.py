@@ -0,0 +1,67 @@
+import time
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from analysis.execution.checkpoint import Checkpoint, CheckpointFuturesExecutor, run_signature
+
+
+def count(item: int) -> dict:
+    return {"items": {item}, "sum": item}
+
+
+def fail_on_one(item: int) -> dict:
+    time.sleep(0.2)
+    if item == 1:
+        raise RuntimeError("chunk failed")
+    return {"items": {item}, "sum": item}
+
+
+def test_run_signature():
+    config = {"processor": ["signal"], "fileset": {"ZZto4L_1": ["a.root"]}}
+    assert run_signature(config) == run_signature(dict(reversed(list(config.items()))))
+    assert run_signature(config) != run_signature({**config, "maxchunks": 2})
+
+
+def test_resume(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "checkpoint.pkl", "signature")
+    assert checkpoint.load() == (None, set())
+    checkpoint.save({"sum": 3}, {("uuid", "a.root", 0, 100)})
+    # a restarted run with the same signature resumes from the saved state
+    resumed = Checkpoint(tmp_path / "checkpoint.pkl", "signature")
+    assert resumed.load() == ({"sum": 3}, {("uuid", "a.root", 0, 100)})
+    resumed.remove()
+    assert not (tmp_path / "checkpoint.pkl").exists()
+
+
+def test_other_run_does_not_resume(tmp_path):
+    Checkpoint(tmp_path / "checkpoint.pkl", "signature").save({"sum": 3}, {1})
+    assert Checkpoint(tmp_path / "checkpoint.pkl", "other").load() == (None, set())
+
+
+def test_truncated_checkpoint_is_ignored(tmp_path):
+    (tmp_path / "checkpoint.pkl").write_bytes(b"")
+    assert Checkpoint(tmp_path / "checkpoint.pkl", "signature").load() == (None, set())
+
+
+def test_futures_executor_checkpoints():
+    saved = []
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        executor = CheckpointFuturesExecutor(
+            pool=pool,
+            workers=2,
+            checkpoint=lambda output, items: saved.append((output["sum"], len(items))),
+            interval=0,
+        )
+        output, _ = executor(list(range(10)), count, None)
+    assert output == {"items": set(range(10)), "sum": 45}
+    # a checkpoint after every chunk but the last one
+    assert len(saved) == 9
+    assert saved[-1][1] == 9
+
+
+def test_futures_executor_cancels_queued_chunks():
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="chunk failed"):
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            CheckpointFuturesExecutor(pool=pool, workers=2)(list(range(40)), fail_on_one, None)
+    # 40 chunks of 0.2 s on 2 workers would take 4 s
+    assert time.monotonic() - start < 2
@@ -0,0 +1,103 @@
+import os
+import shutil
+import pytest
+from pathlib import Path
+from condor.dag import write_dag, read_dag, run_dag_local
+
+REPOSITORY = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def condor_dir(tmp_path, monkeypatch):
+    """working directory with the condor templates"""
+    (tmp_path / "condor").mkdir()
+    for template in ["dag_node.sub", "submit.sh"]:
+        shutil.copy(REPOSITORY / "condor" / template, tmp_path / "condor" / template)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "condor"
+
+
+def tag_eff_job(sample: str, key: str) -> dict:
+    return {
+        "processor": "tag_eff",
+        "year": "2022EE",
+        "sample": sample,
+        "tagger": "pnet",
+        "flavor": "c",
+        "wp": "tight",
+        "mode": "wp",
+        "fileset": f"analysis/filesets/2022EE/{key}.json",
+        "arguments": f"--processor tag_eff --fileset analysis/filesets/2022EE/{key}.json",
+        "job_flavour": "microcentury",
+        "request_memory": 1500,
+        "request_cpus": 2,
+    }
+
+
+def test_write_read_round_trip(condor_dir):
+    jobs = [
+        tag_eff_job("ZZto4L", "ZZto4L_1"),
+        tag_eff_job("ZZto4L", "ZZto4L_2"),
+        tag_eff_job("GluGluHtoZZto4L", "GluGluHtoZZto4L"),
+    ]
+    dag_file = write_dag(jobs, "campaign", retries=2, x509_path="/tmp/x509up")
+    nodes = read_dag(dag_file)
+
+    assert set(nodes) == {
+        "process_0",
+        "process_1",
+        "process_2",
+        "merge_ZZto4L",
+        "merge_GluGluHtoZZto4L",
+        "normalize",
+    }
+    assert all(node["retry"] == 2 for node in nodes.values())
+    assert nodes["merge_ZZto4L"]["parents"] == {"process_0", "process_1"}
+    assert nodes["merge_GluGluHtoZZto4L"]["parents"] == {"process_2"}
+    assert nodes["normalize"]["parents"] == {"merge_ZZto4L", "merge_GluGluHtoZZto4L"}
+
+    process = nodes["process_1"]["vars"]
+    assert process["jobpath"] == "tag_eff/2022EE/pnet/c/tight"
+    assert process["jobname"] == "tag_eff_ZZto4L_2"
+    assert process["arguments"] == f"submit.py {jobs[1]['arguments']}"
+    assert (process["flavour"], process["memory"], process["cpus"]) == ("microcentury", "1500", "2")
+    # merge and normalization only read the outputs of the campaign
+    for node in ["merge_ZZto4L", "normalize"]:
+        assert "--output_dirs tag_eff/2022EE/pnet/c/tight" in nodes[node]["vars"]["arguments"]
+
+    executable = condor_dir / "dags" / "campaign" / "campaign.sh"
+    assert os.access(executable, os.X_OK)
+    assert (condor_dir / "logs" / "tag_eff" / "2022EE" / "pnet" / "c" / "tight").is_dir()
+
+
+def test_run_dag_local(condor_dir, tmp_path):
+    (condor_dir / "node.sub").write_text(
+        "executable = /bin/sh\n"
+        "arguments = $(script)\n"
+        f"output = {condor_dir}/logs/$(jobname).$(ClusterId).$(ProcId).out\n"
+        f"error = {condor_dir}/logs/$(jobname).$(ClusterId).$(ProcId).err\n"
+        f"log = {condor_dir}/logs/$(jobname).$(ClusterId).$(ProcId).log\n"
+        "queue 1\n"
+    )
+    scripts = {
+        "ok": "exit 0",
+        "fail": "exit 3",
+        # fails the first time only
+        "flaky": f"test -f {tmp_path}/flag && exit 0; touch {tmp_path}/flag; exit 1",
+    }
+    for name, script in scripts.items():
+        (tmp_path / f"{name}.sh").write_text(script + "\n")
+    lines = []
+    for node, script in [("a", "ok"), ("b", "fail"), ("c", "ok"), ("d", "flaky"), ("e", "ok")]:
+        lines.append(f"JOB {node} {condor_dir}/node.sub")
+        lines.append(f'VARS {node} jobname="{node}" script="{tmp_path}/{script}.sh"')
+        lines.append(f"RETRY {node} 1")
+    lines += ["PARENT a CHILD b d", "PARENT b CHILD c", "PARENT d CHILD e"]
+    dag_file = tmp_path / "test.dag"
+    dag_file.write_text("\n".join(lines) + "\n")
+
+    status = run_dag_local(str(dag_file), max_jobs=2)
+    assert status == {"a": "done", "b": "failed", "c": "skipped", "d": "done", "e": "done"}
+    # the failed node and the flaky one ran twice
+    assert len(list((condor_dir / "logs").glob("b.*.log"))) == 2
+    assert len(list((condor_dir / "logs").glob("d.*.log"))) == 2
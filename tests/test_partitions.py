@@ -0,0 +1,58 @@
+import random
+import pytest
+from analysis.filesets.utils import consistent_partitions
+
+
+def files(n: int, prefix: str = "file") -> list:
+    return [f"/store/sample/{prefix}_{i}.root" for i in range(n)]
+
+
+def assignment(partitions: list) -> dict:
+    return {item: i for i, partition in enumerate(partitions) for item in partition}
+
+
+def test_every_item_is_assigned_once():
+    items = files(50)
+    partitions = consistent_partitions(items, [1] * len(items), 8)
+    assert sorted(item for partition in partitions for item in partition) == sorted(items)
+
+
+def test_deterministic():
+    items = files(40)
+    costs = [random.Random(i).randint(1, 10) for i in range(len(items))]
+    assert consistent_partitions(items, costs, 6) == consistent_partitions(items, costs, 6)
+
+
+def test_bounded_loads():
+    items = files(200)
+    partitions = consistent_partitions(items, [1] * len(items), 10, load_factor=1.25)
+    assert len(partitions) == 10
+    assert max(len(partition) for partition in partitions) <= 1.25 * 200 / 10
+
+
+def test_adding_a_file_moves_few_files():
+    items = files(200)
+    before = assignment(consistent_partitions(items, [1] * len(items), 10))
+    after = assignment(consistent_partitions(items + ["/store/sample/new.root"], [1] * 201, 10))
+    moved = [item for item in items if before[item] != after[item]]
+    assert len(moved) <= 200 // 10
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_no_empty_partitions_with_skewed_costs(seed):
+    rng = random.Random(seed)
+    items = files(rng.randint(4, 20), prefix=f"seed{seed}")
+    costs = [rng.choice([1, 1, 1, 50]) for _ in items]
+    partitions = consistent_partitions(items, costs, 4)
+    assert all(partitions)
+    assert sum(len(partition) for partition in partitions) == len(items)
+
+
+def test_entry_range_items():
+    items = [
+        {"file": "/store/sample/big.root", "entry_start": i * 10, "entry_stop": (i + 1) * 10}
+        for i in range(6)
+    ]
+    partitions = consistent_partitions(items, [10] * len(items), 3)
+    starts = [item["entry_start"] for partition in partitions for item in partition]
+    assert sorted(starts) == [0, 10, 20, 30, 40, 50]
@@ -0,0 +1,74 @@
+import hist
+import numpy as np
+import pytest
+from analysis.execution.store import write_histograms, HistogramStore
+from analysis.execution.outputs import save_output, load_metadata, histograms_files
+from analysis.postprocess.utils import load_histograms
+
+
+def histograms() -> dict:
+    rng = np.random.default_rng(42)
+    pt = rng.exponential(50, 1000)
+    eta = rng.uniform(-3, 3, 1000)
+    flavor = rng.choice([0, 4, 5], 1000)
+    weight = rng.normal(1, 0.1, 1000)
+
+    weighted = hist.Hist(
+        hist.axis.Variable([20, 30, 50, 100, 1000], name="pt", label="$p_T$ [GeV]"),
+        hist.axis.Regular(10, -2.5, 2.5, name="eta"),
+        hist.axis.IntCategory([0, 4, 5], name="flavor"),
+        storage=hist.storage.Weight(),
+    )
+    weighted.fill(pt=pt, eta=eta, flavor=flavor, weight=weight)
+    counts = hist.Hist(
+        hist.axis.Regular(20, 1, 1000, transform=hist.axis.transform.log, name="pt"),
+        hist.axis.StrCategory([], growth=True, name="tagger"),
+        hist.axis.Boolean(name="tagged"),
+    )
+    counts.fill(pt=pt, tagger="pnet", tagged=pt > 50)
+    counts.fill(pt=pt, tagger="robustparticletransformer", tagged=pt > 30)
+    njets = hist.Hist(hist.axis.Integer(0, 10, name="njets"), storage=hist.storage.Int64())
+    njets.fill(rng.integers(0, 12, 1000))
+    mean = hist.Hist(hist.axis.Regular(5, 0, 250, name="pt"), storage=hist.storage.Mean())
+    mean.fill(pt, sample=weight)
+    return {"weighted": weighted, "counts": counts, "njets": njets, "mean": mean}
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip(tmp_path, compress):
+    original = histograms()
+    path = tmp_path / "output.npz"
+    write_histograms(original, path, compress=compress)
+    store = HistogramStore(path)
+    assert sorted(store) == sorted(original)
+    for name, histogram in original.items():
+        loaded = store[name]
+        # transformed Regular axes are read back as Variable axes with the same edges
+        assert loaded.axes.name == histogram.axes.name
+        for loaded_axis, axis in zip(loaded.axes, histogram.axes):
+            np.testing.assert_allclose(loaded_axis.edges, axis.edges)
+            assert list(loaded_axis) == list(axis)
+        assert loaded.storage_type == histogram.storage_type
+        np.testing.assert_array_equal(
+            np.asarray(loaded.view(flow=True)), np.asarray(histogram.view(flow=True))
+        )
+    assert store["weighted"].axes["pt"].label == "$p_T$ [GeV]"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_uncompressed_members_are_memory_mapped(tmp_path):
+    path = tmp_path / "output.npz"
+    write_histograms(histograms(), path, compress=False)
+    assert isinstance(HistogramStore(path).view("weighted"), np.memmap)
+
+
+def test_save_output(tmp_path):
+    original = histograms()
+    save_output(original, {"sumw": 1.5}, tmp_path, "ZZto4L_1", output_format="pickle")
+    save_output(original, {"sumw": 2.5}, tmp_path, "ZZto4L_1", output_format="npz")
+    # the output of another format is replaced
+    assert histograms_files(tmp_path, "ZZto4L_1") == [tmp_path / "ZZto4L_1.npz"]
+    assert load_metadata(tmp_path, "ZZto4L_1") == {"sumw": 2.5}
+    loaded = load_histograms(tmp_path / "ZZto4L_1.npz")
+    assert loaded["weighted"].sum().value == pytest.approx(original["weighted"].sum().value)
+    assert not list(tmp_path.glob("*.tmp"))
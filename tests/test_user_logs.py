@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+from datetime import datetime
+from condor.user_logs import parse_user_log, analyze_logs, job_flavour, job_resources
+
+USER_LOG = Path(__file__).parent / "data" / "user_log.log"
+
+
+def test_parse_evicted_job():
+    job = parse_user_log(USER_LOG)[(4321098, 0)]
+    assert job["returncode"] == 0
+    assert job["attempts"] == 2
+    assert job["evictions"] == 1
+    assert job["submitted"] == datetime(2024, 3, 1, 10, 0, 0)
+    assert job["start"] == datetime(2024, 3, 1, 11, 5, 0)
+    # wall and cpu times of the last execution
+    assert job["wall_time"] == 3600
+    assert job["cpu_time"] == 57 * 60 + 60
+    assert job["memory"] == 1350
+
+
+def test_parse_held_and_removed_job():
+    job = parse_user_log(USER_LOG)[(4321098, 1)]
+    assert job["holds"] == 1
+    assert job["removed"]
+    assert job["returncode"] is None
+    assert job["wall_time"] is None
+
+
+def test_older_time_format(tmp_path):
+    log = tmp_path / "job.log"
+    log.write_text(
+        "000 (12.000.000) 03/01 10:00:00 Job submitted from host: <1.2.3.4:9618>\n...\n"
+        "001 (12.000.000) 03/01 10:00:10 Job executing on host: <5.6.7.8:9618>\n...\n"
+        "005 (12.000.000) 03/01 10:01:10 Job terminated.\n"
+        "\t(1) Normal termination (return value 1)\n"
+        "\t\tUsr 0 00:00:30, Sys 0 00:00:00  -  Run Remote Usage\n...\n"
+    )
+    job = parse_user_log(log)[(12, 0)]
+    assert job["returncode"] == 1
+    assert job["wall_time"] == 60
+    assert job["cpu_time"] == 30
+
+
+def write_job(condor_path: Path, jobname: str, filesets: dict, wall_time: int) -> None:
+    """single job executable, filesets and user log of a finished signal job"""
+    paths = []
+    for key, files in filesets.items():
+        path = condor_path.parent / f"{key}.json"
+        path.write_text(json.dumps({key: files}))
+        paths.append(str(path))
+    job_dir = condor_path / "signal" / "2022EE"
+    job_dir.mkdir(parents=True, exist_ok=True)
+    (job_dir / f"{jobname}.sh").write_text(
+        f"python3 submit.py --processor signal --year 2022EE --fileset {' '.join(paths)}\n"
+    )
+    logs_dir = condor_path / "logs" / "signal" / "2022EE"
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    cluster = len(list(logs_dir.glob("*.log"))) + 1
+    (logs_dir / f"{jobname}.{cluster}.0.log").write_text(
+        f"000 ({cluster}.000.000) 2024-03-01 10:00:00 Job submitted\n...\n"
+        f"001 ({cluster}.000.000) 2024-03-01 10:00:00 Job executing\n...\n"
+        f"005 ({cluster}.000.000) 2024-03-01 10:{wall_time // 60:02d}:{wall_time % 60:02d} Job terminated.\n"
+        "\t(1) Normal termination (return value 0)\n"
+        "\t\tUsr 0 00:01:00, Sys 0 00:00:00  -  Run Remote Usage\n"
+        "\t   Memory (MB)          :      800      2000      2000\n...\n"
+    )
+
+
+def test_packed_jobs_are_weighted_by_files(tmp_path):
+    condor_path = tmp_path / "condor"
+    # 100 s per file
+    write_job(condor_path, "signal_ZZto4L_1", {"ZZto4L_1": ["a", "b", "c", "d"]}, 400)
+    # packed job of two single file partitions, 200 s per file
+    write_job(condor_path, "signal_ZZto4L_2+1more", {"ZZto4L_2": ["e"], "ZZto4L_3": ["f"]}, 400)
+    report = analyze_logs(condor_path / "logs", "2022EE")
+    assert report["ZZto4L"]["jobs"] == 2
+    assert report["ZZto4L"]["time_per_file"] == (4 * 100 + 2 * 200) / 6
+    assert report["ZZto4L"]["memory"] == 800
+
+
+def test_job_resources(tmp_path):
+    fileset = tmp_path / "ZZto4L_1.json"
+    fileset.write_text(json.dumps({"ZZto4L_1": ["a", "b", "c"]}))
+    report = {
+        "ZZto4L": {
+            "time_per_file": 1200,
+            "memory": 1350,
+            "cpu_usage": 1.1,
+            "eviction_rate": 0.0,
+        }
+    }
+    resources = job_resources({"fileset": str(fileset), "year": "2022EE"}, report)
+    assert resources["expected_duration"] == 3600
+    assert resources["job_flavour"] == job_flavour(3600) == "longlunch"
+    assert resources["request_memory"] == 1700
+    assert resources["request_cpus"] == 1